@@ -0,0 +1,406 @@
+"""
+Benchmarks for the import pipeline using synthetic computer price data
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+CSV_COLUMNS = [
+    'device_type', 'brand', 'model', 'release_year', 'os', 'form_factor',
+    'cpu_brand', 'cpu_model', 'cpu_tier', 'cpu_cores', 'cpu_threads', 'cpu_base_ghz', 'cpu_boost_ghz',
+    'gpu_brand', 'gpu_model', 'vram_gb', 'gpu_tier',
+    'ram_gb', 'storage_type', 'storage_gb', 'storage_drive_count',
+    'display_type', 'display_size_in', 'resolution', 'refresh_hz',
+    'battery_wh', 'charger_watts', 'psu_watts', 'wifi', 'bluetooth',
+    'weight_kg', 'warranty_months', 'price'
+]
+
+BRANDS = ['Apple', 'Dell', 'HP', 'Lenovo', 'Asus', 'Acer', 'MSI', 'Samsung', 'Razer', 'Gigabyte']
+CPU_FAMILIES = [
+    ('Intel', 'Intel Core i{tier}-{gen}{sku}', ['400', '600K', '700H', '900HX', '500U']),
+    ('AMD', 'AMD Ryzen {tier} {gen}{sku}', ['600', '700X', '800H', '900HX', '600U']),
+    ('Apple', 'Apple M{gen}{sku}', ['', ' Pro', ' Max', ' Ultra']),
+]
+GPU_FAMILIES = [('NVIDIA', 'RTX {n}'), ('AMD', 'Radeon RX {n}'), ('Intel', 'Arc A{n}')]
+
+# Build a fixed catalogue of CPUs: (brand, model, tier, cores, threads, base, boost)
+def make_cpus(rng, count):
+    cpus = {}
+    while len(cpus) < count:
+        brand, pattern, skus = rng.choice(CPU_FAMILIES)
+        tier = rng.choice([3, 5, 7, 9])
+        model = pattern.format(tier=tier, gen=rng.randint(1, 14), sku=rng.choice(skus))
+        cores = tier * rng.choice([1, 2])
+        cpus[model] = (brand, model, (tier + 1) // 2 + rng.randint(0, 1), cores, cores * 2,
+                       round(rng.uniform(1.2, 3.8), 1), round(rng.uniform(3.5, 6.0), 1))
+    return list(cpus.values())
+
+# Build a fixed catalogue of GPUs: (brand, model, tier, vram)
+def make_gpus(rng, count):
+    gpus = {}
+    while len(gpus) < count:
+        brand, pattern = rng.choice(GPU_FAMILIES)
+        n = rng.randint(300, 4090)
+        gpus[pattern.format(n=n)] = (brand, pattern.format(n=n), 1 + n * 5 // 4100, rng.choice([4, 6, 8, 12, 16, 24]))
+    return list(gpus.values())
+
+# Seed for the synthetic csv generator
+SEED = 325
+
+# Row counts the benchmark suite runs at
+SUITE_SIZES = [10_000, 1_000_000, 10_000_000]
+
+# Above this many rows the suite imports in stream mode, since full mode holds the whole csv in memory
+FULL_MODE_MAX_ROWS = 1_000_000
+
+# Write a synthetic csv with the layout read_data expects
+def generate_csv(path, rows, seed=SEED, cpu_count=200, gpu_count=100):
+    rng = random.Random(seed)
+    cpus = make_cpus(rng, cpu_count)
+    gpus = make_gpus(rng, gpu_count)
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for _ in range(rows):
+            cpu_brand, cpu_model, cpu_tier, cores, threads, base, boost = rng.choice(cpus)
+            gpu_brand, gpu_model, gpu_tier, vram = rng.choice(gpus)
+            laptop = rng.random() < 0.6
+            brand = rng.choice(BRANDS)
+            price = 250 + cpu_tier * 180 + gpu_tier * 220 + rng.gauss(0, 150) + (0 if laptop else 120)
+            writer.writerow([
+                'Laptop' if laptop else 'Desktop', brand, f"{brand} {rng.choice(['Pro', 'Air', 'Gaming', 'Office', 'Studio'])} {rng.randint(1, 999)}",
+                rng.randint(2016, 2025), rng.choice(['Windows', 'macOS', 'Linux', 'ChromeOS']),
+                rng.choice(['Ultrabook', 'Mainstream', '2-in-1']) if laptop else rng.choice(['Tower', 'SFF', 'All-in-One']),
+                cpu_brand, cpu_model, cpu_tier, cores, threads, base, boost,
+                gpu_brand, gpu_model, vram, gpu_tier,
+                rng.choice([8, 16, 32, 64]), rng.choice(['SSD', 'NVMe', 'HDD']), rng.choice([256, 512, 1024, 2048]), rng.randint(1, 2),
+                rng.choice(['IPS', 'OLED', 'VA', 'TN']), round(rng.uniform(13, 17.3), 1) if laptop else '',
+                rng.choice(['1920x1080', '2560x1440', '3840x2160']), rng.choice([60, 120, 144, 165, 240]),
+                rng.randint(40, 99) if laptop else '', rng.choice([45, 65, 100, 230]) if laptop else '',
+                '' if laptop else rng.choice([450, 650, 850, 1000]),
+                rng.choice(['Wi-Fi 5', 'Wi-Fi 6', 'Wi-Fi 6E', 'Wi-Fi 7']), rng.choice(['5.0', '5.1', '5.2', '5.3']),
+                round(rng.uniform(1.0, 3.5) if laptop else rng.uniform(4, 15), 2), rng.choice([12, 24, 36]),
+                round(max(price, 199.0), 2)
+            ])
+
+# Delete a database and its WAL files
+def remove_db(db_path):
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+# Run one import quietly and return its rows/sec
+def time_import(csv_path, db_path, rows, **options):
+    import main
+    remove_db(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        ok = main.import_data(csv_path=csv_path, db_name=db_path, **options)
+        elapsed = time.perf_counter() - started
+    if not ok:
+        raise RuntimeError(f"Import failed with options {options}")
+    return rows / elapsed
+
+# Path of the synthetic csv for a row count and seed, generating it on first use
+def synthetic_csv(rows, workdir, seed=SEED):
+    csv_path = os.path.join(workdir, f"synthetic_{rows}_{seed}.csv")
+    if not os.path.exists(csv_path):
+        print(f"Generating {rows} synthetic rows...")
+        generate_csv(csv_path, rows, seed)
+    return csv_path
+
+# Compare the default connection profile against the bulk-load profile
+def bench_bulk_profile(rows, workdir):
+    csv_path = synthetic_csv(rows, workdir)
+    db_path = os.path.join(workdir, "bench.db")
+    for label, bulk in (("default profile", False), ("bulk profile", True)):
+        rate = time_import(csv_path, db_path, rows, mode="stream", bulk=bulk)
+        print(f"  {label:<24} {rate:>12,.0f} rows/sec")
+
+# Compare the serial streaming import against the process-pool import at several worker counts
+def bench_parallel(rows, workdir, worker_counts):
+    csv_path = synthetic_csv(rows, workdir)
+    db_path = os.path.join(workdir, "bench.db")
+    rate = time_import(csv_path, db_path, rows, mode="stream")
+    print(f"  {'serial stream':<24} {rate:>12,.0f} rows/sec")
+    for workers in worker_counts:
+        rate = time_import(csv_path, db_path, rows, mode="parallel", workers=workers)
+        print(f"  {f'parallel, {workers} workers':<24} {rate:>12,.0f} rows/sec")
+
+# Compare the per-row conversion loop against the columnar pandas converter, conversion only and end to end
+def bench_converters(rows, workdir):
+    import db_functions as db
+    csv_path = synthetic_csv(rows, workdir)
+    brand_map = {brand: i for i, brand in enumerate(BRANDS, start=1)}
+
+    started = time.perf_counter()
+    for chunk in db.read_chunks(csv_path, None):
+        [db.product_values(row, brand_map[row['brand']]) for row in chunk if row['brand'] in brand_map]
+    loop_rate = rows / (time.perf_counter() - started)
+
+    # Warm up on a few rows first, so the one-off pandas import is not counted against the converter
+    for chunk in db.read_typed_chunks(csv_path, 100):
+        db.product_values_columnar(chunk, brand_map)
+    started = time.perf_counter()
+    for chunk in db.read_typed_chunks(csv_path, None):
+        db.product_values_columnar(chunk, brand_map)
+    columnar_rate = rows / (time.perf_counter() - started)
+
+    print(f"  {'row loop, convert only':<24} {loop_rate:>12,.0f} rows/sec")
+    print(f"  {'columnar, convert only':<24} {columnar_rate:>12,.0f} rows/sec")
+
+    db_path = os.path.join(workdir, "bench.db")
+    for mode in ("stream", "columnar"):
+        rate = time_import(csv_path, db_path, rows, mode=mode)
+        print(f"  {f'{mode} import':<24} {rate:>12,.0f} rows/sec")
+
+# Compare stream imports into SQLite and into PostgreSQL through COPY. The SQLite import also builds
+# the search index and summary tables, so the load and index stages are reported on their own too
+def bench_postgres(rows, workdir, db_url):
+    csv_path = synthetic_csv(rows, workdir)
+    targets = (("SQLite", os.path.join(workdir, "bench.db")), ("PostgreSQL", db_url))
+    for label, target in targets:
+        rate, stages = bench_import_stages(csv_path, target, rows, "stream")
+        print(f"  {f'{label} stream import':<24} {rate:>12,.0f} rows/sec")
+        print(f"  {f'{label} load only':<24} {stages['stream_data']['rows_per_sec']:>12,.0f} rows/sec"
+              f"   (indexes {stages['create_indexes']['seconds']:.2f}s)")
+
+# Min, mean and nearest-rank p50/p95/p99 of latency samples, in milliseconds
+def latency_summary(samples):
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[max(0, -(-len(ordered) * p // 100) - 1)] * 1000
+    return {
+        'min_ms': ordered[0] * 1000,
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': rank(50),
+        'p95_ms': rank(95),
+        'p99_ms': rank(99),
+    }
+
+# Run import_data with stage tracing on. Returns (rows/sec, {stage: {seconds, rows, rows_per_sec, rss_delta_mb}})
+def bench_import_stages(csv_path, db_path, rows, mode):
+    import trace_functions as trace
+    trace.reset()
+    trace.enable()
+    try:
+        rate = time_import(csv_path, db_path, rows, mode=mode)
+    finally:
+        trace.disable()
+
+    stages = {}
+    for event in trace.events:
+        if event['depth'] != 1: continue
+        stages[event['name']] = {
+            'seconds': event['seconds'],
+            'rows': event.get('rows'),
+            'rows_per_sec': event['rows'] / event['seconds'] if event.get('rows') and event['seconds'] > 0 else None,
+            'rss_delta_mb': event['rss_delta_mb'],
+        }
+    return rate, stages
+
+# Chart queries the suite times, each against the summary tables and live against Products
+def chart_queries():
+    import db_functions as db
+    return {
+        'avg_price_by_brand': db.query_avg_price_by_brand,
+        'avg_price_by_brand_type': db.query_avg_price_by_brand_type,
+        'price_by_cpu_tier': db.query_price_by_cpu_tier,
+        'price_stats_by_type': db.query_price_stats_by_type,
+        'price_histogram': db.query_price_histogram,
+        'price_density_by_cpu_tier': db.query_price_density_by_cpu_tier,
+        'price_box_stats': db.query_price_box_stats,
+        'price_box_outliers': db.query_price_box_outliers,
+    }
+
+# Latency of each chart query. Live queries scan the data, so they get fewer repeats
+def bench_chart_queries(db_path, repeats):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    results = {}
+    try:
+        for name, query in chart_queries().items():
+            results[name] = {}
+            for live, count in ((False, repeats), (True, max(3, repeats // 5))):
+                samples = []
+                for _ in range(count):
+                    started = time.perf_counter()
+                    query(conn.cursor(), live=live)
+                    samples.append(time.perf_counter() - started)
+                results[name]['live' if live else 'summary'] = latency_summary(samples)
+    finally:
+        conn.close()
+    return results
+
+# Latency of building each exportable figure from a fresh session, as a first chart request would
+def bench_figures(db_path, repeats):
+    import chart_functions as charts
+    results = {}
+    for name, build in charts.FIGURE_BUILDERS.items():
+        samples = []
+        for _ in range(repeats):
+            session = charts.AnalysisSession(db_path)
+            try:
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    build(session)
+                samples.append(time.perf_counter() - started)
+            finally:
+                session.close()
+        results[name] = latency_summary(samples)
+    return results
+
+# Search strings a support lookup would type, drawn from the database with a fixed seed: a full model name,
+# a model name still being typed, and a model with its CPU family
+def search_terms(conn, count=10, seed=SEED):
+    rng = random.Random(seed)
+    max_id = conn.execute("SELECT MAX(productId) FROM Products").fetchone()[0] or 0
+    terms = []
+    while max_id and len(terms) < count:
+        row = conn.execute("SELECT model, cpu_model FROM Products WHERE productId = ?", (rng.randint(1, max_id),)).fetchone()
+        if row is None: continue
+        model, cpu_model = row
+        terms.append(rng.choice([model, model[:-1], f"{model} {cpu_model.split()[0]}"]))
+    return terms
+
+# Latency of product search through the FTS5 index against the LIKE scan it replaces. The scan reads every
+# product, so it gets a tenth of the repeats
+def bench_search(db_path, repeats, seed=SEED):
+    import db_functions as db
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    results = {}
+    try:
+        terms = search_terms(conn, seed=seed)
+        methods = [('like', db.search_products_like, max(1, repeats // 10))]
+        if db.has_search_index(conn.cursor()):
+            methods.insert(0, ('fts', db.search_products, repeats))
+        for name, search, count in methods:
+            samples = []
+            for _ in range(count):
+                for text in terms:
+                    started = time.perf_counter()
+                    search(conn.cursor(), text)
+                    samples.append(time.perf_counter() - started)
+            results[name] = latency_summary(samples)
+    finally:
+        conn.close()
+    return results
+
+# One suite run at a single size: import, chart queries, figure builds and search. Runs in its own
+# process so peak RSS belongs to this size alone
+def run_suite_size(rows, workdir, repeats, seed):
+    import db_functions as db
+    csv_path = synthetic_csv(rows, workdir, seed)
+    db_path = os.path.join(workdir, f"suite_{rows}.db")
+
+    mode = "full" if rows <= FULL_MODE_MAX_ROWS else "stream"
+    rate, stages = bench_import_stages(csv_path, db_path, rows, mode)
+    result_import = {'mode': mode, 'seconds': rows / rate, 'rows_per_sec': rate, 'stages': stages}
+
+    return {
+        'rows': rows,
+        'csv_mb': os.path.getsize(csv_path) / (1024 * 1024),
+        'db_mb': os.path.getsize(db_path) / (1024 * 1024),
+        'import': result_import,
+        'queries': bench_chart_queries(db_path, repeats),
+        'figures': bench_figures(db_path, max(1, repeats // 4)),
+        'search': bench_search(db_path, repeats, seed),
+        'peak_rss_mb': db.peak_rss_mb(),
+    }
+
+# Run the suite at every size and write the results to a JSON file
+def run_suite(sizes, workdir, repeats, output, seed=SEED):
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeats': repeats,
+        'runs': [],
+    }
+    for rows in sizes:
+        print(f"Suite run, {rows} rows...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            run = pool.submit(run_suite_size, rows, workdir, repeats, seed).result()
+        results['runs'].append(run)
+
+        print(f"  import ({run['import']['mode']}) {run['import']['rows_per_sec']:>12,.0f} rows/sec")
+        for name, stage in run['import']['stages'].items():
+            print(f"    {name:<22} {stage['seconds']:>8.2f}s")
+        for name, latency in run['queries'].items():
+            print(f"  query {name:<26} p50 {latency['summary']['p50_ms']:>8.2f} ms   live p50 {latency['live']['p50_ms']:>9.2f} ms")
+        for name, latency in run['figures'].items():
+            print(f"  figure {name:<25} p50 {latency['p50_ms']:>8.2f} ms   p95 {latency['p95_ms']:>8.2f} ms")
+        for name, latency in run['search'].items():
+            print(f"  search {name:<25} p50 {latency['p50_ms']:>8.2f} ms   p95 {latency['p95_ms']:>8.2f} ms")
+        print(f"  peak RSS {run['peak_rss_mb']:.1f} MB")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return results
+
+# Fail when any chart query plan falls back to a full scan of a large table
+def check_plans(db_path):
+    import db_functions as db
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        violations = db.check_query_plans(conn)
+    finally:
+        conn.close()
+    for name, detail in violations:
+        print(f"  FULL SCAN in {name}: {detail}")
+    print("Query plans OK." if not violations else f"{len(violations)} query plan regressions.")
+    return not violations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import pipeline benchmarks")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic csv size")
+    parser.add_argument("--workdir", default=tempfile.gettempdir(), help="Where csv and database files are written")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts for the parallel import")
+    parser.add_argument("--check-plans", metavar="DB", help="Only check chart query plans against an imported database")
+    parser.add_argument("--postgres", metavar="URL", help="Only compare SQLite and PostgreSQL import throughput, loading into URL")
+    parser.add_argument("--search", metavar="DB", help="Only compare FTS5 search with a LIKE scan on an imported database")
+    parser.add_argument("--suite", action="store_true", help="Run the import, chart query and figure suite and write JSON results")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES, help="Row counts for --suite")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed repeats per chart query in --suite")
+    parser.add_argument("--seed", type=int, default=SEED, help="Synthetic data seed for --suite")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file for --suite")
+    args = parser.parse_args()
+
+    if args.check_plans:
+        sys.exit(0 if check_plans(args.check_plans) else 1)
+
+    if args.search:
+        for name, latency in bench_search(args.search, args.repeats, args.seed).items():
+            print(f"  search {name:<6} p50 {latency['p50_ms']:>9.2f} ms   p95 {latency['p95_ms']:>9.2f} ms")
+        sys.exit(0)
+
+    if args.postgres:
+        print(f"Import throughput, {args.rows} rows:")
+        bench_postgres(args.rows, args.workdir, args.postgres)
+        sys.exit(0)
+
+    if args.suite:
+        run_suite(args.sizes, args.workdir, args.repeats, args.output, args.seed)
+        sys.exit(0)
+
+    print(f"Import throughput, {args.rows} rows:")
+    bench_bulk_profile(args.rows, args.workdir)
+    bench_parallel(args.rows, args.workdir, args.workers)
+    bench_converters(args.rows, args.workdir)
@@ -2,38 +2,433 @@
 Functions used for creating charts and querying data
 """
 
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import numpy as np
 import db_functions as db
+import trace_functions as trace
 
-# Query all products with joined brand and CPU tier information. Returns dataframe
-def get_products_dataframe(conn):
-    query = """
+# Cached dataframes are written here, next to the database file
+CACHE_DIR_NAME = ".cache"
+
+# Directory for cached dataframes of the connected database, or None for in-memory databases
+def get_cache_dir(conn):
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not db_path:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CACHE_DIR_NAME)
+
+# Write a dataframe to the cache. Feather (via pyarrow) is used when available so later loads can be memory-mapped.
+# Each writer uses its own temp file, so processes building the same frame at once don't move each other's file;
+# the last rename wins, and every writer wrote the same frame
+def write_cached_frame(df, path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=os.path.basename(path))
+    os.close(fd)
+    try:
+        if path.endswith(".feather"):
+            df.to_feather(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # e.g. on Windows, when another writer's file is already in place and open
+            if not os.path.exists(path):
+                raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Read a dataframe written by write_cached_frame
+def read_cached_frame(path):
+    if path.endswith(".feather"):
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
+
+# Cache file extension: Feather when pyarrow is installed, otherwise pickle
+def cache_extension():
+    try:
+        import pyarrow  # noqa: F401
+        return "feather"
+    except ImportError:
+        return "pkl"
+
+# SQL expression and required join for each column the products dataframe can hold
+FRAME_COLUMNS = {col: (f"p.{col}", None) for col in ('productId',) + db.PRODUCT_COLUMNS}
+FRAME_COLUMNS.update({
+    'brand': ("b.brand_name", 'b'),
+    'cpu_tier': ("c.cpu_tier", 'c'),
+    'gpu_tier': ("g.gpu_tier", 'g'),
+})
+FRAME_JOINS = {
+    'b': "JOIN Brands b ON p.brandId = b.brandId",
+    'c': "JOIN CPU c ON p.cpu_model = c.cpu_model",
+    'g': "JOIN GPU g ON p.gpu_model = g.gpu_model",
+}
+
+# With the compact schema, the frame columns ProductData holds as dictionary keys: the key column and the
+# query listing (key, value) pairs. The keys are loaded as integers and decoded by decode_keys, so SQL never
+# decodes a product row. The tier joins go through the integer model keys too
+COMPACT_FRAME_KEYS = {
+    'brand': ("p.brandId", "SELECT brandId, brand_name FROM Brands"),
+    'cpu_model': ("p.cpuId", "SELECT cpuId, cpu_model FROM CpuModels"),
+    'gpu_model': ("p.gpuId", "SELECT gpuId, gpu_model FROM GpuModels"),
+}
+COMPACT_FRAME_KEYS.update({
+    col: (f"p.{db.compact_column(col)}", f"SELECT attrId, value FROM Attributes WHERE name = '{col}'")
+    for col in db.COMPACT_ATTRIBUTES
+})
+COMPACT_FRAME_JOINS = {
+    'c': "JOIN CpuModels c ON p.cpuId = c.cpuId",
+    'g': "JOIN GpuModels g ON p.gpuId = g.gpuId",
+}
+
+# Low-cardinality text columns, loaded as pandas categoricals
+CATEGORICAL_COLUMNS = (
+    'brand', 'device_type', 'os', 'form_factor', 'storage_type', 'display_type',
+    'resolution', 'wifi', 'bluetooth', 'cpu_model', 'gpu_model'
+)
+
+# Float columns kept at full precision so averages and hover values are exact
+FULL_PRECISION_COLUMNS = ('price',)
+
+# Columns each product-level chart reads. Every other chart is drawn from SQL aggregates
+CHART_COLUMNS = {
+    'tier-price': ['cpu_tier', 'price', 'model', 'brand', 'device_type'],
+}
+
+# Above this many products the price vs CPU tier scatter switches to LARGE_SCATTER_MODE so the page stays small:
+# 'density' plots product counts on a CPU tier x price grid, 'sample' plots a stratified sample of this many products
+SCATTER_POINT_LIMIT = 50000
+LARGE_SCATTER_MODE = 'density'
+
+# Query products with joined brand, CPU and GPU tier information. Returns dataframe.
+# Pass columns to load only what a chart needs, and filters (see db.normalize_filter) to load only matching
+# products. Unfiltered results are cached on disk under the database's data version, so each column set
+# is only queried once per import
+@trace.traced(rows=len)
+def get_products_dataframe(conn, columns=None, use_cache=True, filters=None):
+    columns = list(columns) if columns else list(FRAME_COLUMNS)
+    cache_dir = get_cache_dir(conn) if use_cache and not db.normalize_filter(filters) else None
+    version = db.get_data_version(conn.cursor()) if cache_dir else None
+    if version is None:
+        return query_products_dataframe(conn, columns, filters)
+
+    column_key = hashlib.blake2b(",".join(columns).encode('utf-8'), digest_size=6).hexdigest()
+    path = os.path.join(cache_dir, f"products_{version}_{column_key}.{cache_extension()}")
+    if os.path.exists(path):
+        return read_cached_frame(path)
+
+    df = query_products_dataframe(conn, columns)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Frames for older data versions can never be read again
+    for old_path in glob.glob(os.path.join(cache_dir, "products_*")):
+        if not os.path.basename(old_path).startswith(f"products_{version}_"):
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+    write_cached_frame(df, path)
+    return df
+
+# Query the given product columns straight from the database, joining only the tables they need. Returns dataframe
+@trace.traced(rows=len)
+def query_products_dataframe(conn, columns, filters=None):
+    unknown = [col for col in columns if col not in FRAME_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown product columns: {', '.join(unknown)}")
+
+    src = db.product_source(conn.cursor())
+    keys = [col for col in columns if col in COMPACT_FRAME_KEYS] if src['compact'] else []
+    joins = []
+    select = []
+    for col in columns:
+        if col in keys:
+            select.append(f"{COMPACT_FRAME_KEYS[col][0]} AS {col}")
+            continue
+        expr, join = FRAME_COLUMNS[col]
+        if join:
+            join = (COMPACT_FRAME_JOINS if src['compact'] else FRAME_JOINS)[join]
+            if join not in joins:
+                joins.append(join)
+        select.append(f"{expr} AS {col}")
+    select = ",\n        ".join(select)
+    where, params = db.where_sql(filters, compact=src['compact'])
+    query = f"""
     SELECT 
-        p.*,
-        b.brand_name as brand,
-        c.cpu_tier,
-        g.gpu_tier
-    FROM Products p
-    JOIN Brands b ON p.brandId = b.brandId
-    JOIN CPU c ON p.cpu_model = c.cpu_model
-    JOIN GPU g ON p.gpu_model = g.gpu_model
+        {select}
+    FROM {src['table']} p
+    {" ".join(joins)}
+    {where}
     """
-    return pd.read_sql_query(query, conn)
+    df = pd.read_sql_query(query, conn, params=params)
+    for col in keys:
+        df[col] = decode_keys(df[col], conn.execute(COMPACT_FRAME_KEYS[col][1]).fetchall())
+    return optimize_dtypes(df)
+
+# Decode a column of dictionary keys into a categorical of their values, given the (key, value) pairs.
+# Like astype('category'), the categories are the sorted values that occur
+def decode_keys(keys, lookup):
+    categories = sorted(value for _, value in lookup)
+    positions = {value: i for i, value in enumerate(categories)}
+    codes = keys.map({key: positions[value] for key, value in lookup}).fillna(-1).astype('int32')
+    return pd.Categorical.from_codes(codes, categories).remove_unused_categories()
+
+# Shrink a products dataframe: categoricals for repeated strings, narrowest numeric dtypes otherwise
+def optimize_dtypes(df):
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[col]) and col not in FULL_PRECISION_COLUMNS:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+    return df
+
+# In-memory size of a dataframe in MB, counting string contents
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+# Average price by brand, aggregated in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_avg_price_by_brand(conn, limit=None, filters=None):
+    rows = db.query_avg_price_by_brand(conn.cursor(), limit, filters=filters)
+    return pd.DataFrame(rows, columns=['brand', 'price'])
+
+# Average price by brand and device type, aggregated in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_avg_price_grouped(conn, filters=None):
+    rows = db.query_avg_price_by_brand_type(conn.cursor(), filters=filters)
+    return pd.DataFrame(rows, columns=['brand', 'device_type', 'price'])
+
+# Price summary statistics per device type, aggregated in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_price_stats(conn, filters=None):
+    rows = db.query_price_stats_by_type(conn.cursor(), filters=filters)
+    return pd.DataFrame(rows, columns=['Type', 'Count', 'Mean', 'Median', 'Min', 'Max'])
+
+# Price histogram bins counted in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_price_histogram(conn, bins=20, filters=None):
+    bin_centers, counts = db.query_price_histogram(conn.cursor(), bins, filters=filters)
+    return pd.DataFrame({'Price ($)': bin_centers, 'Count': counts})
+
+# Product counts on a device type x CPU tier x price grid, aggregated in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_price_density(conn, bins=db.DENSITY_BINS, filters=None):
+    rows = db.query_price_density_by_cpu_tier(conn.cursor(), bins, filters=filters)
+    return pd.DataFrame(rows, columns=['device_type', 'cpu_tier', 'price', 'count'])
+
+# Box plot quartiles and whisker ends per device type, computed in SQLite. Returns dataframe
+@trace.traced(rows=len)
+def get_box_stats(conn, filters=None):
+    rows = db.query_price_box_stats(conn.cursor(), filters=filters)
+    return pd.DataFrame(rows, columns=['device_type', 'count', 'q1', 'median', 'q3', 'lowerfence', 'upperfence'])
+
+# Capped sample of box plot outliers per device type. Returns dataframe
+@trace.traced(rows=len)
+def get_box_outliers(conn, limit=db.BOX_OUTLIER_LIMIT, filters=None):
+    rows = db.query_price_box_outliers(conn.cursor(), limit, filters=filters)
+    return pd.DataFrame(rows, columns=['device_type', 'price'])
+
+# Box traces drawn from precomputed statistics, one box and one outlier marker trace per device type,
+# so the figure carries a handful of numbers per box instead of every price
+def price_box_traces(stats, outliers, showlegend=True):
+    colors = px.colors.qualitative.Plotly
+    traces = []
+    for i, row in enumerate(stats.itertuples(index=False)):
+        color = colors[i % len(colors)]
+        traces.append(go.Box(
+            x=[row.device_type], q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            name=row.device_type, legendgroup=row.device_type, showlegend=showlegend,
+            marker_color=color
+        ))
+        points = outliers.loc[outliers['device_type'] == row.device_type, 'price']
+        traces.append(go.Scatter(
+            x=[row.device_type] * len(points), y=points, mode='markers',
+            name=row.device_type, legendgroup=row.device_type, showlegend=False,
+            marker=dict(color=color, size=4), hovertemplate='Price: $%{y}<extra>Outlier</extra>'
+        ))
+    return traces
+
+# Random sample of about limit rows that keeps each group's share of the data. Returns the frame itself when it is small enough
+@trace.traced(rows=len)
+def stratified_sample(df, by, limit, seed=0):
+    if len(df) <= limit:
+        return df
+    return df.groupby(by, observed=True, group_keys=False).sample(frac=limit / len(df), random_state=seed)
+
+# Loaded data and memoized aggregates kept for the life of the program. Chart functions read
+# through a session, so repeat requests skip both the database and the pandas work.
+# Entries are evicted least recently used first; sync() drops everything once another import has committed.
+# Safe to share between threads: each thread reads through its own connection, and concurrent requests
+# for the same entry wait for a single computation. Every computation is stamped with the cache generation
+# it started in, which sync() and invalidate() advance, so a result computed from data that has since been
+# replaced is returned to its own callers but never cached or handed to later ones
+class AnalysisSession:
+    def __init__(self, db_name, max_entries=32):
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.connections = db.ConnectionManager(db_name)
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.version = None
+        self.generation = 0
+        self.pool = None
+        self.pool_workers = None
+
+    # Thread pool for building dashboard panels, started on first use and kept for the life of the session,
+    # so its threads and their read connections are reused by every build
+    def thread_pool(self, workers):
+        with self.lock:
+            if self.pool is None or self.pool_workers != workers:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=False)
+                self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dashboard')
+                self.pool_workers = workers
+            return self.pool
+
+    # Long-lived read-only connection for the calling thread
+    def connection(self):
+        return self.connections.reader()
+
+    # Drop cached data if the database's data version changed since it was loaded, e.g. by an import in another process
+    def sync(self):
+        version = db.get_data_version(self.connection().cursor())
+        with self.lock:
+            if version != self.version:
+                self.cache.clear()
+                self.version = version
+                self.generation += 1
+
+    # Cached value for key, computed and stored on a miss. The computation runs outside the lock.
+    # Callers only wait on a computation from the current generation
+    def memo(self, key, compute):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            generation = self.generation
+            pending, pending_generation = self.pending.get(key, (None, None))
+            owner = pending is None or pending_generation != generation
+            if owner:
+                pending = Future()
+                self.pending[key] = (pending, generation)
+        if not owner:
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self.lock:
+                if self.pending.get(key, (None,))[0] is pending:
+                    del self.pending[key]
+            pending.set_exception(e)
+            raise
+        with self.lock:
+            if self.pending.get(key, (None,))[0] is pending:
+                del self.pending[key]
+            if self.generation == generation:
+                self.cache[key] = value
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        pending.set_result(value)
+        return value
+
+    # Products dataframe with the given columns, optionally sorted and filtered. Served from any cached
+    # frame with the same filter that already holds the columns
+    def frame(self, columns, sort_by=None, filters=None):
+        columns = tuple(columns)
+        filters = db.normalize_filter(filters)
+        if sort_by:
+            return self.memo(('frame', columns, sort_by, filters),
+                             lambda: self.frame(columns, filters=filters).sort_values(sort_by))
+
+        key = ('frame', columns, None, filters)
+        with self.lock:
+            cached = list(self.cache.items()) if key not in self.cache else []
+        for cached_key, source in reversed(cached):
+            if (cached_key[0] == 'frame' and cached_key[2] is None and cached_key[3] == filters
+                    and set(columns) <= set(cached_key[1])):
+                return self.memo(key, lambda: source[list(columns)])
+        return self.memo(key, lambda: get_products_dataframe(self.connection(), columns, filters=filters))
+
+    # Rows of a products dataframe split by a column, from a single groupby
+    def groups(self, columns, by, sort_by=None, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('groups', tuple(columns), by, sort_by, filters),
+                         lambda: dict(list(self.frame(columns, sort_by, filters).groupby(by, sort=False, observed=True))))
+
+    # Memoized SQL aggregates, keyed on the normalized filter so each drill-down is queried once per data version
+    def avg_price_by_brand(self, limit=None, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('avg_price_by_brand', limit, filters),
+                         lambda: get_avg_price_by_brand(self.connection(), limit, filters))
+
+    def avg_price_grouped(self, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('avg_price_grouped', filters), lambda: get_avg_price_grouped(self.connection(), filters))
+
+    def price_stats(self, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('price_stats', filters), lambda: get_price_stats(self.connection(), filters))
+
+    def price_histogram(self, bins=20, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('price_histogram', bins, filters), lambda: get_price_histogram(self.connection(), bins, filters))
+
+    def price_density(self, bins=db.DENSITY_BINS, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('price_density', bins, filters), lambda: get_price_density(self.connection(), bins, filters))
+
+    def box_stats(self, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('box_stats', filters), lambda: get_box_stats(self.connection(), filters))
+
+    def box_outliers(self, limit=db.BOX_OUTLIER_LIMIT, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('box_outliers', limit, filters), lambda: get_box_outliers(self.connection(), limit, filters))
+
+    # 'points' when every matching product can be plotted, otherwise LARGE_SCATTER_MODE. Counted from the stats aggregate, not Products
+    def scatter_mode(self, filters=None):
+        return 'points' if self.price_stats(filters)['Count'].sum() <= SCATTER_POINT_LIMIT else LARGE_SCATTER_MODE
+
+    # Stratified sample of the products, by device type, for the scatter's 'sample' mode
+    def scatter_sample(self, columns, filters=None):
+        filters = db.normalize_filter(filters)
+        return self.memo(('scatter_sample', tuple(columns), filters),
+                         lambda: stratified_sample(self.frame(columns, filters=filters), 'device_type', SCATTER_POINT_LIMIT))
+
+    # Forget all cached data, e.g. after import_data changed the database
+    def invalidate(self):
+        with self.lock:
+            self.cache.clear()
+            self.version = None
+            self.generation += 1
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        self.connections.close()
 
 # Price distribution
-def show_price_histogram(df):
-    price_data = df['price'].dropna()
-    counts, bin_edges = np.histogram(price_data, bins=20)
-    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
-    
-    hist_df = pd.DataFrame({
-        'Price ($)': bin_centers,
-        'Count': counts
-    })
+@trace.traced()
+def build_price_histogram(session, filters=None):
+    hist_df = session.price_histogram(filters=filters)
     
     fig = px.bar(
         hist_df,
@@ -44,12 +439,12 @@ def show_price_histogram(df):
     )
     
     fig.update_layout(bargap=0.05) 
-    fig.show()
+    return fig
 
 # Brand price averages
-def show_avg_price_by_brand(df):
-    avg_data = df.groupby('brand')['price'].mean().reset_index()
-    avg_data = avg_data.sort_values('price', ascending=False)
+@trace.traced()
+def build_avg_price_by_brand(session, filters=None):
+    avg_data = session.avg_price_by_brand(filters=filters)
     fig = px.bar(
         avg_data,
         x='brand',
@@ -57,11 +452,12 @@ def show_avg_price_by_brand(df):
         title='Average Price by Manufacturer',
         labels={'price': 'Average Price ($)', 'brand': 'Manufacturer'}
     )
-    fig.show()
+    return fig
 
 # Brand price grouped by device type
-def show_avg_price_grouped(df):
-    avg_data = df.groupby(['brand', 'device_type'])['price'].mean().reset_index()
+@trace.traced()
+def build_avg_price_grouped(session, filters=None):
+    avg_data = session.avg_price_grouped(filters=filters)
     fig = px.bar(
         avg_data,
         x='brand',
@@ -71,37 +467,150 @@ def show_avg_price_grouped(df):
         title='Average Price by Manufacturer & Type',
         labels={'price': 'Average Price ($)', 'brand': 'Manufacturer', 'device_type': 'Device Type'}
     )
-    fig.show()
+    return fig
+
+# Scatter of price vs cpu tier. Large datasets are drawn as a density grid or a sample, see SCATTER_POINT_LIMIT
+@trace.traced()
+def build_price_vs_cpu_tier(session, filters=None):
+    mode = session.scatter_mode(filters)
+    if mode == 'density':
+        fig = px.scatter(
+            session.price_density(filters=filters),
+            x='cpu_tier',
+            y='price',
+            size='count',
+            size_max=30,
+            title='Price vs. CPU Tier (product density)',
+            labels={'cpu_tier': 'CPU Tier', 'price': 'Price ($)', 'count': 'Products'},
+            color='device_type',
+            render_mode='webgl'
+        )
+        return fig
 
-# Scatter of price vs cpu tier
-def show_price_vs_cpu_tier(df):
-    df = df.sort_values('cpu_tier')
+    if mode == 'sample':
+        df = session.scatter_sample(CHART_COLUMNS['tier-price'], filters)
+        title = f'Price vs. CPU Tier (sample of {len(df):,} products)'
+    else:
+        df = session.frame(CHART_COLUMNS['tier-price'], sort_by='cpu_tier', filters=filters)
+        title = 'Price vs. CPU Tier (WebGL)'
     fig = px.scatter(
         df,
         x='cpu_tier',
         y='price',
         hover_data=['model', 'brand'],
-        title='Price vs. CPU Tier (WebGL)',
+        title=title,
         labels={'cpu_tier': 'CPU Tier', 'price': 'Price ($)'},
         color='device_type',
         render_mode='webgl'
     )
-    fig.show()
+    return fig
 
-# Box/whisker for device type
-def show_box_price_by_type(df):
-    fig = px.box(
-        df,
-        x='device_type',
-        y='price', 
+# Box/whisker for device type, from precomputed quartiles and a capped outlier sample
+@trace.traced()
+def build_box_price_by_type(session, filters=None):
+    fig = go.Figure(price_box_traces(session.box_stats(filters), session.box_outliers(filters=filters)))
+    fig.update_layout(
         title='Price Distribution: Laptop vs Desktop',
-        labels={'price': 'Price ($)', 'device_type': 'Device Type'},
-        color='device_type'
+        xaxis_title='Device Type',
+        yaxis_title='Price ($)',
+        legend_title_text='Device Type'
     )
-    fig.show()
+    return fig
+
+# Dashboard panels. Each reads its own data through the session and returns the traces for its subplot cell
+@trace.traced()
+def histogram_panel(session, filters=None):
+    hist_df = session.price_histogram(filters=filters)
+    return [go.Bar(x=hist_df['Price ($)'], y=hist_df['Count'], name='Price Distribution', showlegend=False)]
+
+@trace.traced()
+def brand_panel(session, filters=None):
+    avg_data = session.avg_price_by_brand(limit=10, filters=filters)  # Top 10
+    return [go.Bar(x=avg_data['brand'], y=avg_data['price'], name='Avg Price', showlegend=False)]
+
+@trace.traced()
+def grouped_panel(session, filters=None):
+    traces = []
+    for device_type, subset in session.avg_price_grouped(filters).groupby('device_type', sort=False):
+        subset = subset.sort_values('price', ascending=False).head(10)
+        traces.append(go.Bar(x=subset['brand'], y=subset['price'], name=device_type))
+    return traces
+
+@trace.traced()
+def scatter_panel(session, filters=None):
+    mode = session.scatter_mode(filters)
+    traces = []
+    if mode == 'density':
+        density = session.price_density(filters=filters)
+        sizeref = 2 * density['count'].max() / 30 ** 2
+        for device_type, subset in density.groupby('device_type', sort=False):
+            traces.append(go.Scattergl(
+                x=subset['cpu_tier'],
+                y=subset['price'],
+                mode='markers',
+                name=device_type,
+                marker=dict(size=subset['count'], sizemode='area', sizeref=sizeref, opacity=0.6),
+                customdata=subset['count'],
+                hovertemplate='CPU Tier: %{x}<br>Price: ~$%{y:.0f}<br>Products: %{customdata}<extra></extra>'
+            ))
+        return traces
+
+    if mode == 'sample':
+        sample = session.scatter_sample(CHART_COLUMNS['tier-price'], filters)
+        points = dict(list(sample.groupby('device_type', sort=False, observed=True)))
+    else:
+        points = session.groups(CHART_COLUMNS['tier-price'], 'device_type', sort_by='cpu_tier', filters=filters)
+    for device_type, subset in points.items():
+        traces.append(go.Scattergl(
+            x=subset['cpu_tier'],
+            y=subset['price'],
+            mode='markers',
+            name=device_type,
+            marker=dict(size=4, opacity=0.6),
+            text=subset['model'],
+            hovertemplate='<b>%{text}</b><br>CPU Tier: %{x}<br>Price: $%{y}<extra></extra>'
+        ))
+    return traces
+
+@trace.traced()
+def box_panel(session, filters=None):
+    return price_box_traces(session.box_stats(filters), session.box_outliers(filters=filters), showlegend=False)
+
+@trace.traced()
+def stats_panel(session, filters=None):
+    stats = session.price_stats(filters).copy()
+    stats['Mean'] = stats['Mean'].round(2)
+    stats['Median'] = stats['Median'].round(2)
+    return [go.Table(
+        header=dict(
+            values=list(stats.columns),
+            fill_color='paleturquoise',
+            align='left',
+            font=dict(size=12, color='black')
+        ),
+        cells=dict(
+            values=[stats[col] for col in stats.columns],
+            fill_color='lavender',
+            align='left',
+            font=dict(size=11)
+        )
+    )]
+
+# Dashboard panel builders and the (row, col) cell each fills
+DASHBOARD_PANELS = [
+    (histogram_panel, 1, 1),
+    (brand_panel, 1, 2),
+    (grouped_panel, 2, 1),
+    (scatter_panel, 2, 2),
+    (box_panel, 3, 1),
+    (stats_panel, 3, 2),
+]
 
-# Display all charts on single dashboard
-def show_dashboard(df):
+# Display all charts on single dashboard. The panels are built concurrently on the session's thread pool, each thread
+# querying through its own read connection, and added to the figure in a fixed order once all are done.
+# Only the scatter panel can need individual products
+@trace.traced()
+def build_dashboard(session, workers=len(DASHBOARD_PANELS), filters=None):
     fig = make_subplots(
         rows=3, cols=2,
         subplot_titles=(
@@ -121,79 +630,16 @@ def show_dashboard(df):
         horizontal_spacing=0.1
     )
     
-    price_data = df['price'].dropna()
-    counts, bin_edges = np.histogram(price_data, bins=20)
-    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
-    
-    fig.add_trace(
-        go.Bar(x=bin_centers, y=counts, name='Price Distribution', showlegend=False),
-        row=1, col=1
-    )
-    
-    avg_data = df.groupby('brand')['price'].mean().reset_index()
-    avg_data = avg_data.sort_values('price', ascending=False).head(10)  # Top 10
-    
-    fig.add_trace(
-        go.Bar(x=avg_data['brand'], y=avg_data['price'], name='Avg Price', showlegend=False),
-        row=1, col=2
-    )
-    
-    grouped_data = df.groupby(['brand', 'device_type'])['price'].mean().reset_index()
-    
-    for device_type in grouped_data['device_type'].unique():
-        subset = grouped_data[grouped_data['device_type'] == device_type]
-        subset = subset.sort_values('price', ascending=False).head(10)
-        fig.add_trace(
-            go.Bar(x=subset['brand'], y=subset['price'], name=device_type),
-            row=2, col=1
-        )
-    
-    df_sorted = df.sort_values('cpu_tier')
-    
-    for device_type in df_sorted['device_type'].unique():
-        subset = df_sorted[df_sorted['device_type'] == device_type]
-        fig.add_trace(
-            go.Scattergl(
-                x=subset['cpu_tier'],
-                y=subset['price'],
-                mode='markers',
-                name=device_type,
-                marker=dict(size=4, opacity=0.6),
-                text=subset['model'],
-                hovertemplate='<b>%{text}</b><br>CPU Tier: %{x}<br>Price: $%{y}<extra></extra>'
-            ),
-            row=2, col=2
-        )
-    
-    for device_type in df['device_type'].unique():
-        subset = df[df['device_type'] == device_type]
-        fig.add_trace(
-            go.Box(y=subset['price'], name=device_type, showlegend=False),
-            row=3, col=1
-        )
-    
-    stats = df.groupby('device_type')['price'].agg(['count', 'mean', 'median', 'min', 'max']).reset_index()
-    stats.columns = ['Type', 'Count', 'Mean', 'Median', 'Min', 'Max']
-    stats['Mean'] = stats['Mean'].round(2)
-    stats['Median'] = stats['Median'].round(2)
+    if workers > 1:
+        pool = session.thread_pool(workers)
+        panels = [pool.submit(panel, session, filters) for panel, _, _ in DASHBOARD_PANELS]
+        panel_traces = [future.result() for future in panels]
+    else:
+        panel_traces = [panel(session, filters) for panel, _, _ in DASHBOARD_PANELS]
     
-    fig.add_trace(
-        go.Table(
-            header=dict(
-                values=list(stats.columns),
-                fill_color='paleturquoise',
-                align='left',
-                font=dict(size=12, color='black')
-            ),
-            cells=dict(
-                values=[stats[col] for col in stats.columns],
-                fill_color='lavender',
-                align='left',
-                font=dict(size=11)
-            )
-        ),
-        row=3, col=2
-    )
+    for traces, (_, row, col) in zip(panel_traces, DASHBOARD_PANELS):
+        for panel_trace in traces:
+            fig.add_trace(panel_trace, row=row, col=col)
     
     fig.update_layout(
         title_text="Computer Price Analysis Dashboard",
@@ -224,4 +670,111 @@ def show_dashboard(df):
     fig.update_xaxes(title_text="Device Type", row=3, col=1)
     fig.update_yaxes(title_text="Price ($)", row=3, col=1)
     
-    fig.show()
\ No newline at end of file
+    return fig
+
+# Display each figure in the browser, optionally for only the products matching filters
+def show_price_histogram(session, filters=None):
+    build_price_histogram(session, filters).show()
+
+def show_avg_price_by_brand(session, filters=None):
+    build_avg_price_by_brand(session, filters).show()
+
+def show_avg_price_grouped(session, filters=None):
+    build_avg_price_grouped(session, filters).show()
+
+def show_price_vs_cpu_tier(session, filters=None):
+    build_price_vs_cpu_tier(session, filters).show()
+
+def show_box_price_by_type(session, filters=None):
+    build_box_price_by_type(session, filters).show()
+
+def show_dashboard(session, filters=None):
+    build_dashboard(session, filters=filters).show()
+
+# Figure builders by export name, matching the chart options in the README
+FIGURE_BUILDERS = {
+    'frequency-price': build_price_histogram,
+    'price': build_avg_price_by_brand,
+    'grouped-price': build_avg_price_grouped,
+    'tier-price': build_price_vs_cpu_tier,
+    'boxed-price': build_box_price_by_type,
+    'dashboard': build_dashboard,
+}
+
+EXPORT_FORMATS = ('html', 'json')
+
+# Exported HTML pages load plotly.js from this file in the export directory instead of embedding a copy each
+PLOTLY_JS_NAME = "plotly.min.js"
+
+# Maps each exported file to the data version it was built from
+MANIFEST_NAME = "manifest.json"
+
+# Build one figure in its own session and write it to out_dir. Runs in an export worker process
+def export_figure(db_name, name, out_dir, fmt):
+    session = AnalysisSession(db_name)
+    try:
+        fig = FIGURE_BUILDERS[name](session)
+    finally:
+        session.close()
+
+    path = os.path.join(out_dir, f"{name}.{fmt}")
+    tmp_path = path + ".tmp"
+    if fmt == 'json':
+        fig.write_json(tmp_path)
+    else:
+        fig.write_html(tmp_path, include_plotlyjs=PLOTLY_JS_NAME, full_html=True)
+    os.replace(tmp_path, path)
+    return name
+
+# Read the export manifest, or an empty one when there is none
+def read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# Export figures to out_dir as HTML or figure JSON, building them in parallel worker processes.
+# Figures already exported in the same format from the current data version are skipped unless force is set.
+# Returns (built, skipped) lists of figure names
+@trace.traced()
+def export_figures(db_name, out_dir, fmt='html', names=None, workers=None, force=False):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    names = list(names) if names else list(FIGURE_BUILDERS)
+    unknown = [name for name in names if name not in FIGURE_BUILDERS]
+    if unknown:
+        raise ValueError(f"Unknown figures: {', '.join(unknown)}")
+
+    conn = db.getconn_readonly(db_name)
+    try:
+        version = db.get_data_version(conn.cursor())
+    finally:
+        conn.close()
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = read_manifest(out_dir)
+    skipped = [name for name in names
+               if not force and version is not None and manifest.get(f"{name}.{fmt}") == version
+               and os.path.exists(os.path.join(out_dir, f"{name}.{fmt}"))]
+    pending = [name for name in names if name not in skipped]
+
+    if fmt == 'html' and pending and not os.path.exists(os.path.join(out_dir, PLOTLY_JS_NAME)):
+        from plotly.offline import get_plotlyjs
+        with open(os.path.join(out_dir, PLOTLY_JS_NAME), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    built = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pending))) as pool:
+            futures = [pool.submit(export_figure, db_name, name, out_dir, fmt) for name in pending]
+            for future in futures:
+                name = future.result()
+                manifest[f"{name}.{fmt}"] = version
+                built.append(name)
+
+    tmp_path = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+    return built, skipped
@@ -1,29 +1,203 @@
 import sqlite3
 import csv
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-# Get connection with database
-def getconn(db_name="computers.db"):
+# Rows per batch when streaming the csv into the database
+CHUNK_SIZE = 50000
+
+# Bytes of csv handed to each worker by the parallel import
+SHARD_BYTES = 16 * 1024 * 1024
+
+# Max keys per IN (...) lookup, kept under SQLite's bound variable limit
+LOOKUP_BATCH = 500
+
+# Products columns in insert order (everything except productId)
+PRODUCT_COLUMNS = (
+    'brandId', 'cpu_model', 'gpu_model', 'device_type', 'model', 'release_year', 'os', 'form_factor',
+    'ram_gb', 'storage_type', 'storage_gb', 'storage_drive_count', 'display_type', 'display_size_in',
+    'resolution', 'refresh_hz', 'battery_wh', 'charger_watts', 'psu_watts', 'wifi', 'bluetooth',
+    'weight_kg', 'warranty_months', 'price'
+)
+
+# Columns a feed may change without the row becoming a different product
+PRODUCT_MUTABLE_COLUMNS = ('warranty_months', 'price')
+
+# Numeric Products columns parsed straight from the csv by the columnar converter
+INT_PRODUCT_COLUMNS = (
+    'release_year', 'ram_gb', 'storage_gb', 'storage_drive_count', 'refresh_hz',
+    'battery_wh', 'charger_watts', 'psu_watts', 'warranty_months'
+)
+FLOAT_PRODUCT_COLUMNS = ('display_size_in', 'weight_kg', 'price')
+
+INSERT_PRODUCT_SQL = f"""
+    INSERT INTO Products ({', '.join(PRODUCT_COLUMNS)}) 
+    VALUES ({', '.join('?' for _ in PRODUCT_COLUMNS)})
+"""
+
+# Connection profile for large imports: WAL journal, no fsync, a 256 MB page cache and
+# foreign keys checked once at the end of the load instead of on every row
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = OFF;",
+    "PRAGMA cache_size = -262144;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA foreign_keys = OFF;",
+]
+
+# Connection profile restored once a bulk load has committed
+SAFE_PRAGMAS = [
+    "PRAGMA synchronous = FULL;",
+    "PRAGMA cache_size = -2000;",
+    "PRAGMA temp_store = DEFAULT;",
+    "PRAGMA foreign_keys = ON;",
+]
+
+# Read connection profile: queries only, the file memory-mapped and a 64 MB page cache
+READ_PRAGMAS = [
+    "PRAGMA query_only = ON;",
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA cache_size = -65536;",
+    "PRAGMA temp_store = MEMORY;",
+]
+
+# Prepared statements each read connection keeps, so repeated chart queries skip parsing
+READ_STATEMENT_CACHE = 256
+
+# Get connection with database. Writers always use the WAL journal so readers are never blocked by a load
+def getconn(db_name="computers.db", bulk=False):
     conn = sqlite3.connect(db_name)
-    conn.execute("PRAGMA foreign_keys = ON;") 
+    if bulk:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+    else:
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA foreign_keys = ON;") 
     return conn
 
-# Set up the database by clearing existing tables and adding the table schemas
-def setup_db(cur):
-    print("Resetting tables...")
-    cur.execute('DROP TABLE IF EXISTS Products;')
-    cur.execute('DROP TABLE IF EXISTS CPU;')
-    cur.execute('DROP TABLE IF EXISTS GPU;')
-    cur.execute('DROP TABLE IF EXISTS Brands;')
+# Module that loads a database target: pg_functions for postgres:// and postgresql:// URLs, otherwise this one,
+# with the target as a SQLite file. Both provide the connection, schema and insert functions main.import_data loads through
+def get_backend(target):
+    if target.startswith(('postgres://', 'postgresql://')):
+        import pg_functions
+        return pg_functions
+    return sys.modules[__name__]
+
+# Get a read-only connection with the read profile. Under WAL it sees the last committed data, even during an import
+def getconn_readonly(db_name="computers.db"):
+    uri = f"file:{os.path.abspath(db_name)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, cached_statements=READ_STATEMENT_CACHE, check_same_thread=False)
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# Idle read connections a ConnectionManager keeps for later threads; any more are closed
+MAX_IDLE_READERS = 4
+
+# Long-lived read-only connections, one per thread so no connection is shared between concurrent queries,
+# plus fresh write connections on request. A thread's reader goes back to a small idle pool when the thread
+# calls release() or finishes, so short-lived threads reuse connections instead of each leaking one
+class ConnectionManager:
+    def __init__(self, db_name, max_idle=MAX_IDLE_READERS):
+        self.db_name = db_name
+        self.max_idle = max_idle
+        self.local = threading.local()
+        self.readers = set()
+        self.idle = []
+        self.lock = threading.Lock()
 
-    cur.execute('''
-        CREATE TABLE Brands (
+    # This thread's read connection: an idle one from the pool, or a new one when the pool is empty
+    def reader(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = getconn_readonly(self.db_name)
+                with self.lock:
+                    self.readers.add(conn)
+            self.local.conn = conn
+            # Hands the connection back if the thread ends without calling release()
+            self.local.finalizer = weakref.finalize(threading.current_thread(), self.put_back, conn)
+            self.local.finalizer.atexit = False
+        return conn
+
+    # Return this thread's read connection to the pool, e.g. at the end of a request
+    def release(self):
+        finalizer = getattr(self.local, 'finalizer', None)
+        self.local.conn = self.local.finalizer = None
+        if finalizer is not None:
+            finalizer()
+
+    def put_back(self, conn):
+        with self.lock:
+            if conn not in self.readers:
+                return
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+            self.readers.discard(conn)
+        conn.close()
+
+    # Number of open read connections, in use or idle
+    def open_readers(self):
+        with self.lock:
+            return len(self.readers)
+
+    # A new write connection. The caller commits and closes it
+    def writer(self, bulk=False):
+        return getconn(self.db_name, bulk)
+
+    # Close every read connection, including those held by other threads. Only call this once
+    # those threads are done with them
+    def close(self):
+        with self.lock:
+            readers, self.readers, self.idle = self.readers, set(), []
+        for conn in readers:
+            conn.close()
+        self.local = threading.local()
+
+# Open the single explicit transaction a bulk load runs in
+def begin_bulk_load(conn):
+    conn.execute("BEGIN")
+
+# Verify foreign keys, commit the bulk load, refresh planner statistics and switch back to the safe profile.
+# With changed=False the load wrote no rows, so the foreign key check and ANALYZE are skipped
+def finish_bulk_load(conn, changed=True):
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall() if changed else []
+    if violations:
+        table, rowid, parent, _ = violations[0]
+        raise sqlite3.IntegrityError(
+            f"{len(violations)} foreign key violations after bulk load (first: {table} row {rowid} -> {parent})"
+        )
+    conn.commit()
+    if changed:
+        print("Analyzing tables...")
+        conn.execute("ANALYZE")
+    for pragma in SAFE_PRAGMAS:
+        conn.execute(pragma)
+
+# Table schemas, in creation order
+SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS Brands (
             brandId     INTEGER PRIMARY KEY AUTOINCREMENT,
             brand_name  TEXT NOT NULL UNIQUE
         );
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE CPU (
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS CPU (
             cpu_model   TEXT NOT NULL PRIMARY KEY,
             brandId     INTEGER NOT NULL,
             cpu_tier    INTEGER,
@@ -33,20 +207,18 @@ def setup_db(cur):
             cpu_boost_ghz   REAL,
             FOREIGN KEY(brandId) REFERENCES Brands(brandId)
         );
-    ''')
-
-    cur.execute('''
-        CREATE TABLE GPU (
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS GPU (
             gpu_model   TEXT NOT NULL PRIMARY KEY,
             brandId     INTEGER NOT NULL,
             gpu_tier    INTEGER,
             vram_gb     INTEGER,
             FOREIGN KEY(brandId) REFERENCES Brands(brandId)
         );
-    ''')
-
-    cur.execute('''
-        CREATE TABLE Products (
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS Products (
             productId       INTEGER PRIMARY KEY AUTOINCREMENT,
             brandId         INTEGER NOT NULL,
             cpu_model       TEXT NOT NULL,
@@ -76,7 +248,432 @@ def setup_db(cur):
             FOREIGN KEY(cpu_model) REFERENCES CPU(cpu_model),
             FOREIGN KEY(gpu_model) REFERENCES GPU(gpu_model)
         );
-    ''')
+    ''',
+    # Key/value settings that outlive a reload, such as the data version
+    '''
+        CREATE TABLE IF NOT EXISTS Metadata (
+            key     TEXT PRIMARY KEY,
+            value   TEXT
+        );
+    ''',
+    # Identity key and content fingerprint of each product, used by incremental imports
+    '''
+        CREATE TABLE IF NOT EXISTS ProductKeys (
+            productId   INTEGER PRIMARY KEY,
+            row_key     TEXT NOT NULL UNIQUE,
+            row_hash    TEXT NOT NULL,
+            FOREIGN KEY(productId) REFERENCES Products(productId) ON DELETE CASCADE
+        );
+    ''',
+    # Csv rows a resumable import could not load, with the reason
+    '''
+        CREATE TABLE IF NOT EXISTS ImportErrors (
+            errorId     INTEGER PRIMARY KEY AUTOINCREMENT,
+            row_number  INTEGER NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            reason      TEXT NOT NULL,
+            raw_row     TEXT
+        );
+    ''',
+]
+
+# Low-cardinality Products text columns the compact schema stores as ids into the Attributes dictionary
+COMPACT_ATTRIBUTES = ('device_type', 'os', 'form_factor', 'storage_type', 'display_type', 'resolution', 'wifi', 'bluetooth')
+
+# ProductData column holding each Products column in the compact schema
+def compact_column(col):
+    if col == 'cpu_model': return 'cpuId'
+    if col == 'gpu_model': return 'gpuId'
+    if col in COMPACT_ATTRIBUTES: return f'{col}_id'
+    return col
+
+# Expression producing each Products column from the compact tables, for the compatibility view. Lookups are
+# scalar subqueries rather than joins, so a query only pays for the columns it reads
+def compact_select_sql(col):
+    if col == 'cpu_model': return '(SELECT cpu_model FROM CpuModels WHERE cpuId = ProductData.cpuId)'
+    if col == 'gpu_model': return '(SELECT gpu_model FROM GpuModels WHERE gpuId = ProductData.gpuId)'
+    if col in COMPACT_ATTRIBUTES: return f'(SELECT value FROM Attributes WHERE attrId = ProductData.{col}_id)'
+    return f'ProductData.{col}'
+
+# Expression resolving a new Products row's column to its ProductData value, for the insert trigger
+def compact_insert_sql(col):
+    if col == 'cpu_model': return '(SELECT cpuId FROM CpuModels WHERE cpu_model = NEW.cpu_model)'
+    if col == 'gpu_model': return '(SELECT gpuId FROM GpuModels WHERE gpu_model = NEW.gpu_model)'
+    if col in COMPACT_ATTRIBUTES: return f"(SELECT attrId FROM Attributes WHERE name = '{col}' AND value = NEW.{col})"
+    return f'NEW.{col}'
+
+# Products view over the compact tables
+def compact_products_view_sql():
+    columns = ",\n            ".join(f"{compact_select_sql(col)} AS {col}" for col in PRODUCT_COLUMNS)
+    return f"""
+        CREATE VIEW IF NOT EXISTS Products AS
+        SELECT ProductData.productId AS productId,
+            {columns}
+        FROM ProductData;
+    """
+
+# Trigger turning an insert into the Products view into dictionary entries plus a ProductData row
+def compact_products_trigger_sql():
+    attribute_inserts = "\n            ".join(
+        f"INSERT OR IGNORE INTO Attributes (name, value) SELECT '{col}', NEW.{col} WHERE NEW.{col} IS NOT NULL;"
+        for col in COMPACT_ATTRIBUTES
+    )
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS products_insert INSTEAD OF INSERT ON Products
+        BEGIN
+            {attribute_inserts}
+            INSERT INTO ProductData (productId, {", ".join(compact_column(col) for col in PRODUCT_COLUMNS)})
+            VALUES (NEW.productId, {", ".join(compact_insert_sql(col) for col in PRODUCT_COLUMNS)});
+        END;
+    """
+
+# Optional compact schema: integer keys for CPUs and GPUs, a dictionary table for the repeated text attributes,
+# and views named Products, CPU and GPU with the wide schema's columns. Inserts into the views go through
+# INSTEAD OF triggers, so queries and ad-hoc inserts work unchanged; the import modes write ProductData directly
+# through write_products. Incremental imports are not supported
+COMPACT_SCHEMA = [
+    SCHEMA[0],  # Brands
+    '''
+        CREATE TABLE IF NOT EXISTS CpuModels (
+            cpuId       INTEGER PRIMARY KEY,
+            cpu_model   TEXT NOT NULL UNIQUE,
+            brandId     INTEGER NOT NULL,
+            cpu_tier    INTEGER,
+            cpu_cores   INTEGER,
+            cpu_threads INTEGER,
+            cpu_base_ghz    REAL,
+            cpu_boost_ghz   REAL,
+            FOREIGN KEY(brandId) REFERENCES Brands(brandId)
+        );
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS GpuModels (
+            gpuId       INTEGER PRIMARY KEY,
+            gpu_model   TEXT NOT NULL UNIQUE,
+            brandId     INTEGER NOT NULL,
+            gpu_tier    INTEGER,
+            vram_gb     INTEGER,
+            FOREIGN KEY(brandId) REFERENCES Brands(brandId)
+        );
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS Attributes (
+            attrId  INTEGER PRIMARY KEY,
+            name    TEXT NOT NULL,
+            value   TEXT NOT NULL,
+            UNIQUE(name, value)
+        );
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS ProductData (
+            productId       INTEGER PRIMARY KEY AUTOINCREMENT,
+            brandId         INTEGER NOT NULL,
+            cpuId           INTEGER NOT NULL,
+            gpuId           INTEGER NOT NULL,
+            device_type_id  INTEGER,
+            model           TEXT NOT NULL,
+            release_year    INTEGER,
+            os_id           INTEGER,
+            form_factor_id  INTEGER,
+            ram_gb          INTEGER,
+            storage_type_id INTEGER,
+            storage_gb      INTEGER,
+            storage_drive_count INTEGER,
+            display_type_id INTEGER,
+            display_size_in REAL,
+            resolution_id   INTEGER,
+            refresh_hz      INTEGER,
+            battery_wh      INTEGER,
+            charger_watts   INTEGER,
+            psu_watts       INTEGER,
+            wifi_id         INTEGER,
+            bluetooth_id    INTEGER,
+            weight_kg       REAL,
+            warranty_months INTEGER,
+            price           REAL NOT NULL,
+            FOREIGN KEY(brandId) REFERENCES Brands(brandId),
+            FOREIGN KEY(cpuId) REFERENCES CpuModels(cpuId),
+            FOREIGN KEY(gpuId) REFERENCES GpuModels(gpuId)
+        );
+    ''',
+    SCHEMA[4],  # Metadata
+    SCHEMA[6],  # ImportErrors
+    '''
+        CREATE VIEW IF NOT EXISTS CPU AS
+        SELECT cpu_model, brandId, cpu_tier, cpu_cores, cpu_threads, cpu_base_ghz, cpu_boost_ghz FROM CpuModels;
+    ''',
+    '''
+        CREATE VIEW IF NOT EXISTS GPU AS
+        SELECT gpu_model, brandId, gpu_tier, vram_gb FROM GpuModels;
+    ''',
+    compact_products_view_sql(),
+    '''
+        CREATE TRIGGER IF NOT EXISTS cpu_insert INSTEAD OF INSERT ON CPU
+        BEGIN
+            INSERT INTO CpuModels (cpu_model, brandId, cpu_tier, cpu_cores, cpu_threads, cpu_base_ghz, cpu_boost_ghz)
+            VALUES (NEW.cpu_model, NEW.brandId, NEW.cpu_tier, NEW.cpu_cores, NEW.cpu_threads, NEW.cpu_base_ghz, NEW.cpu_boost_ghz);
+        END;
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS gpu_insert INSTEAD OF INSERT ON GPU
+        BEGIN
+            INSERT INTO GpuModels (gpu_model, brandId, gpu_tier, vram_gb)
+            VALUES (NEW.gpu_model, NEW.brandId, NEW.gpu_tier, NEW.vram_gb);
+        END;
+    ''',
+    compact_products_trigger_sql(),
+]
+
+INSERT_PRODUCT_DATA_SQL = f"""
+    INSERT INTO ProductData ({', '.join(compact_column(col) for col in PRODUCT_COLUMNS)})
+    VALUES ({', '.join('?' for _ in PRODUCT_COLUMNS)})
+"""
+
+# Drop a table or view if it exists. Dropping a view also drops its triggers
+def drop_relation(cur, name):
+    row = cur.execute("SELECT type FROM sqlite_master WHERE name = ? AND type IN ('table', 'view')", (name,)).fetchone()
+    if row:
+        cur.execute(f"DROP {row[0].upper()} {name};")
+
+# True when the database uses the compact schema
+def is_compact(cur):
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ProductData'").fetchone() is not None
+
+# Insert Products tuples. With brand_names the first value is the brand name rather than its id.
+# In the compact schema the dictionary ids are resolved here a batch at a time and the rows go straight
+# into ProductData, which is much cheaper than running the view's insert trigger once per row
+def write_products(cur, values, brand_names=False):
+    if not values:
+        return
+    if not is_compact(cur):
+        query = INSERT_PRODUCT_SQL
+        if brand_names:
+            query = query.replace("VALUES (?,", "VALUES ((SELECT brandId FROM Brands WHERE brand_name = ?),", 1)
+        cur.executemany(query, values)
+        return
+
+    positions = {col: i for i, col in enumerate(PRODUCT_COLUMNS)}
+    for col in COMPACT_ATTRIBUTES:
+        new_values = {row[positions[col]] for row in values} - {None}
+        cur.executemany("INSERT OR IGNORE INTO Attributes (name, value) VALUES (?, ?)", [(col, v) for v in new_values])
+    attributes = {col: {} for col in COMPACT_ATTRIBUTES}
+    for attr_id, name, value in cur.execute("SELECT attrId, name, value FROM Attributes"):
+        attributes[name][value] = attr_id
+
+    lookups = [None] * len(PRODUCT_COLUMNS)
+    if brand_names:
+        lookups[positions['brandId']] = get_brand_map(cur)
+    lookups[positions['cpu_model']] = dict(cur.execute("SELECT cpu_model, cpuId FROM CpuModels"))
+    lookups[positions['gpu_model']] = dict(cur.execute("SELECT gpu_model, gpuId FROM GpuModels"))
+    for col in COMPACT_ATTRIBUTES:
+        lookups[positions[col]] = attributes[col]
+
+    encoded = [tuple(v if lookup is None else lookup.get(v) for v, lookup in zip(row, lookups)) for row in values]
+    cur.executemany(INSERT_PRODUCT_DATA_SQL, encoded)
+
+# Set up the database by clearing existing tables and adding the table schemas, wide or compact
+def setup_db(cur, compact=False):
+    print("Resetting tables...")
+    for table in SUMMARY_TABLES:
+        cur.execute(f'DROP TABLE IF EXISTS {table};')
+    for name in ('ProductKeys', 'ImportErrors', 'ProductSearch', 'ProductSearchContent', 'Products', 'CPU', 'GPU', 'ProductData', 'CpuModels', 'GpuModels', 'Attributes', 'Brands'):
+        drop_relation(cur, name)
+    ensure_schema(cur, compact)
+    # A checkpoint left by an interrupted resumable import points into tables that no longer exist
+    clear_checkpoint(cur)
+
+# Create any missing tables without touching existing data. compact=None keeps the database's current layout
+def ensure_schema(cur, compact=None):
+    if compact is None:
+        compact = is_compact(cur)
+    for statement in COMPACT_SCHEMA if compact else SCHEMA:
+        cur.execute(statement)
+
+# Record a new data version. Caches keyed on the previous version become stale
+def bump_data_version(cur):
+    version = uuid.uuid4().hex
+    cur.execute("""
+        INSERT INTO Metadata (key, value) VALUES ('data_version', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (version,))
+    return version
+
+# Current data version, or None for databases imported before versions were recorded
+def get_data_version(cur):
+    try:
+        row = cur.execute("SELECT value FROM Metadata WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+# Secondary indexes on Products. The (x, price) indexes cover the chart aggregates so they never touch the table itself,
+# and every product filter field has an index to start from
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_products_brand_type_price ON Products(brandId, device_type, price);",
+    "CREATE INDEX IF NOT EXISTS idx_products_type_price ON Products(device_type, price);",
+    "CREATE INDEX IF NOT EXISTS idx_products_cpu_type_price ON Products(cpu_model, device_type, price);",
+    "CREATE INDEX IF NOT EXISTS idx_products_gpu ON Products(gpu_model);",
+    "CREATE INDEX IF NOT EXISTS idx_products_price ON Products(price);",
+    "CREATE INDEX IF NOT EXISTS idx_products_year ON Products(release_year);",
+    "CREATE INDEX IF NOT EXISTS idx_products_os ON Products(os);",
+    "CREATE INDEX IF NOT EXISTS idx_products_ram ON Products(ram_gb);",
+]
+
+# The same indexes for the compact schema's ProductData table
+COMPACT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_productdata_brand_type_price ON ProductData(brandId, device_type_id, price);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_type_price ON ProductData(device_type_id, price);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_cpu_type_price ON ProductData(cpuId, device_type_id, price);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_gpu ON ProductData(gpuId);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_price ON ProductData(price);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_year ON ProductData(release_year);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_os ON ProductData(os_id);",
+    "CREATE INDEX IF NOT EXISTS idx_productdata_ram ON ProductData(ram_gb);",
+]
+
+# Create the secondary indexes. Run after a bulk load, since building them once is cheaper than maintaining them per row
+def create_indexes(cur):
+    print("Creating indexes...")
+    for statement in COMPACT_INDEXES if is_compact(cur) else INDEXES:
+        cur.execute(statement)
+
+# Text the product search index covers, one row per product
+SEARCH_CONTENT_VIEW = '''
+    CREATE VIEW IF NOT EXISTS ProductSearchContent AS
+    SELECT p.productId AS productId, p.model AS model, b.brand_name AS brand, p.cpu_model AS cpu_model, p.gpu_model AS gpu_model
+    FROM Products p
+    JOIN Brands b ON p.brandId = b.brandId;
+'''
+
+# The same view for the compact schema, joining the model tables on their integer keys
+COMPACT_SEARCH_CONTENT_VIEW = '''
+    CREATE VIEW IF NOT EXISTS ProductSearchContent AS
+    SELECT p.productId AS productId, p.model AS model, b.brand_name AS brand, c.cpu_model AS cpu_model, g.gpu_model AS gpu_model
+    FROM ProductData p
+    JOIN Brands b ON p.brandId = b.brandId
+    JOIN CpuModels c ON p.cpuId = c.cpuId
+    JOIN GpuModels g ON p.gpuId = g.gpuId;
+'''
+
+# FTS5 index over product model, brand, CPU and GPU names, with rowid = productId. It reads its text from
+# ProductSearchContent, so the index holds only tokens. A two-character prefix index keeps type-ahead lookups fast
+SEARCH_INDEX = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS ProductSearch USING fts5(
+        model, brand, cpu_model, gpu_model,
+        content = 'ProductSearchContent', content_rowid = 'productId', prefix = '2'
+    );
+'''
+
+# bm25 weight of each indexed column, in index order: a model match counts most
+SEARCH_WEIGHTS = (4.0, 1.0, 2.0, 2.0)
+
+# True when the database has a product search index
+def has_search_index(cur):
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'ProductSearch'").fetchone() is not None
+
+# (Re)build the product search index from the current products. Returns False, leaving search on LIKE scans,
+# when this SQLite build has no FTS5
+def build_search_index(cur):
+    print("Building search index...")
+    try:
+        cur.execute(COMPACT_SEARCH_CONTENT_VIEW if is_compact(cur) else SEARCH_CONTENT_VIEW)
+        cur.execute(SEARCH_INDEX)
+    except sqlite3.OperationalError as e:
+        print(f"  Search index skipped: {e}")
+        return False
+    cur.execute("INSERT INTO ProductSearch (ProductSearch) VALUES ('rebuild')")
+    return True
+
+# Add products first_id..last_id to the search index
+def index_products(cur, first_id, last_id):
+    cur.execute("""
+        INSERT INTO ProductSearch (rowid, model, brand, cpu_model, gpu_model)
+        SELECT productId, model, brand, cpu_model, gpu_model FROM ProductSearchContent
+        WHERE productId BETWEEN ? AND ?
+    """, (first_id, last_id))
+
+# Remove the products whose ids the subquery selects from the search index. Run before deleting them,
+# since removing a product's tokens needs its text
+def unindex_products(cur, id_subquery):
+    cur.execute(f"""
+        INSERT INTO ProductSearch (ProductSearch, rowid, model, brand, cpu_model, gpu_model)
+        SELECT 'delete', productId, model, brand, cpu_model, gpu_model FROM ProductSearchContent
+        WHERE productId IN ({id_subquery})
+    """)
+
+# FTS5 query matching every word of the search text, the last one also as a prefix. Words are quoted, so
+# punctuation in SKUs like "i7-1360P" is tokenized instead of parsed as query syntax. The last word's exact
+# match scores on top of its prefix match, so "pro 12" ranks "Pro 12" above "Pro 128". A single character
+# is only matched exactly, since as a prefix it matches most of the catalogue
+def search_match_query(text):
+    words = [word for word in text.split() if any(ch.isalnum() for ch in word)]
+    if not words:
+        return None
+    phrases = ['"' + word.replace('"', '""') + '"' for word in words]
+    if len(words[-1]) > 1:
+        phrases[-1] = f"({phrases[-1]} OR {phrases[-1]}*)"
+    return " AND ".join(phrases)
+
+# Columns search results are returned with
+SEARCH_RESULT_COLUMNS = (
+    'productId', 'model', 'brand', 'device_type', 'cpu_model', 'cpu_tier', 'gpu_model', 'gpu_tier', 'price', 'score'
+)
+
+SEARCH_RESULT_SELECT = """
+    SELECT p.productId, p.model, b.brand_name, p.device_type, p.cpu_model, c.cpu_tier, p.gpu_model, g.gpu_tier, p.price
+"""
+
+SEARCH_RESULT_JOINS = """
+    JOIN Brands b ON p.brandId = b.brandId
+    JOIN CPU c ON p.cpu_model = c.cpu_model
+    JOIN GPU g ON p.gpu_model = g.gpu_model
+"""
+
+# Products matching every word of text in their model, brand, CPU or GPU name, best bm25 match first.
+# Returns rows in SEARCH_RESULT_COLUMNS order; lower scores are better. Falls back to search_products_like
+# on databases without a search index
+def search_products(cur, text, limit=20):
+    if not has_search_index(cur):
+        return search_products_like(cur, text, limit)
+    query = search_match_query(text)
+    if query is None:
+        return []
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    return cur.execute(f"""
+        WITH matches AS (
+            SELECT rowid AS productId, bm25(ProductSearch, {weights}) AS score
+            FROM ProductSearch
+            WHERE ProductSearch MATCH :query
+            ORDER BY score
+            LIMIT :limit
+        )
+        {SEARCH_RESULT_SELECT}, m.score
+        FROM matches m
+        JOIN Products p ON p.productId = m.productId
+        {SEARCH_RESULT_JOINS}
+        ORDER BY m.score, p.productId
+    """, {'query': query, 'limit': limit}).fetchall()
+
+# Substring version of search_products: every word must appear, via LIKE '%word%', in one of the columns.
+# Scans every product. Results come in productId order with no score
+def search_products_like(cur, text, limit=20):
+    words = text.split()
+    if not words:
+        return []
+    conditions = []
+    params = {'limit': limit}
+    for i, word in enumerate(words):
+        params[f"w{i}"] = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(" + " OR ".join(f"{col} LIKE :w{i} ESCAPE '\\'"
+                                             for col in ('p.model', 'b.brand_name', 'p.cpu_model', 'p.gpu_model')) + ")")
+    return cur.execute(f"""
+        {SEARCH_RESULT_SELECT}, NULL
+        FROM Products p
+        {SEARCH_RESULT_JOINS}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.productId
+        LIMIT :limit
+    """, params).fetchall()
 
 # Read data from csv file
 def read_csv(csv_filepath, data_limit):
@@ -92,6 +689,36 @@ def read_csv(csv_filepath, data_limit):
     except Exception as e:
         print(f"Error reading {csv_filepath}: {e}")
 
+# Read csv rows in lists of at most chunk_size rows
+def read_chunks(csv_filepath, data_limit, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for row in read_csv(csv_filepath, data_limit):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# CPU and GPU set entries of a csv row, as cpu_values and gpu_values take them
+def row_cpu(row):
+    return (
+        row['cpu_model'], row['cpu_brand'], row['cpu_tier'],
+        row['cpu_cores'], row['cpu_threads'], row['cpu_base_ghz'], row['cpu_boost_ghz']
+    )
+
+def row_gpu(row):
+    return (row['gpu_model'], row['gpu_brand'], row['gpu_tier'], row['vram_gb'])
+
+# Add the brands, CPU and GPU of a csv row to the table sets
+def add_row_entities(row, brands_set, cpus_set, gpus_set):
+    if row['brand']: brands_set.add(row['brand'])
+    if row['cpu_brand']: brands_set.add(row['cpu_brand'])
+    if row['gpu_brand']: brands_set.add(row['gpu_brand'])
+    
+    cpus_set.add(row_cpu(row))
+    gpus_set.add(row_gpu(row))
+
 # Read data from the csv rows and add to table sets
 def read_data(csv_filepath, data_limit):
     print("Reading in CSV file data...")
@@ -101,19 +728,7 @@ def read_data(csv_filepath, data_limit):
     product_rows = []
     
     for row in read_csv(csv_filepath, data_limit):
-        if row['brand']: brands_set.add(row['brand'])
-        if row['cpu_brand']: brands_set.add(row['cpu_brand'])
-        if row['gpu_brand']: brands_set.add(row['gpu_brand'])
-        
-        cpus_set.add((
-            row['cpu_model'], row['cpu_brand'], row['cpu_tier'],
-            row['cpu_cores'], row['cpu_threads'], row['cpu_base_ghz'], row['cpu_boost_ghz']
-        ))
-        
-        gpus_set.add((
-            row['gpu_model'], row['gpu_brand'], row['gpu_tier'], row['vram_gb']
-        ))
-        
+        add_row_entities(row, brands_set, cpus_set, gpus_set)
         product_rows.append(row)
     
     print("CSV read complete.\n")
@@ -125,16 +740,15 @@ def get_brand_map(cur):
     return {row[0]: row[1] for row in cur.fetchall()}
 
 # Insert brands into table
-def insert_brands(cur, brands_set):
-    print(f"Populating Brands table ({len(brands_set)} items)...")
+def insert_brands(cur, brands_set, verbose=True):
+    if verbose: print(f"Populating Brands table ({len(brands_set)} items)...")
     if not brands_set: return
 
     values = [(b,) for b in brands_set if b]
     cur.executemany("INSERT OR IGNORE INTO Brands (brand_name) VALUES (?)", values)
 
-# Insert CPUs into table
-def insert_cpus(cur, cpus_set, brand_map):
-    print(f"Populating CPU table ({len(cpus_set)} items)...")
+# Convert CPU set entries into CPU table tuples, skipping unknown brands
+def cpu_values(cpus_set, brand_map):
     values = []
     
     for entry in cpus_set:
@@ -150,17 +764,10 @@ def insert_cpus(cur, cpus_set, brand_map):
             float(base) if base else None,
             float(boost) if boost else None
         ))
+    return values
 
-    if values:
-        query = """
-            INSERT OR IGNORE INTO CPU (cpu_model, brandId, cpu_tier, cpu_cores, cpu_threads, cpu_base_ghz, cpu_boost_ghz) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-        cur.executemany(query, values)
-
-# Insert GPUs into table
-def insert_gpus(cur, gpus_set, brand_map):
-    print(f"Populating GPU table ({len(gpus_set)} items)...")
+# Convert GPU set entries into GPU table tuples, skipping unknown brands
+def gpu_values(gpus_set, brand_map):
     values = []
 
     for entry in gpus_set:
@@ -173,47 +780,1097 @@ def insert_gpus(cur, gpus_set, brand_map):
             int(gpu_tier) if gpu_tier else None,
             int(vram) if vram else None
         ))
+    return values
+
+# Insert CPUs into table
+def insert_cpus(cur, cpus_set, brand_map, verbose=True):
+    if verbose: print(f"Populating CPU table ({len(cpus_set)} items)...")
+    values = cpu_values(cpus_set, brand_map)
+
+    if values:
+        query = """
+            INSERT OR IGNORE INTO CPU (cpu_model, brandId, cpu_tier, cpu_cores, cpu_threads, cpu_base_ghz, cpu_boost_ghz) 
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        cur.executemany(query, values)
+
+# Insert GPUs into table
+def insert_gpus(cur, gpus_set, brand_map, verbose=True):
+    if verbose: print(f"Populating GPU table ({len(gpus_set)} items)...")
+    values = gpu_values(gpus_set, brand_map)
 
     if values:
         query = "INSERT OR IGNORE INTO GPU (gpu_model, brandId, gpu_tier, vram_gb) VALUES (?, ?, ?, ?)"
         cur.executemany(query, values)
 
+# Insert new CPUs and update ones whose attributes changed. Returns number of rows written
+def upsert_cpus(cur, cpus_set, brand_map):
+    values = cpu_values(cpus_set, brand_map)
+    if not values: return 0
+    query = """
+        INSERT INTO CPU (cpu_model, brandId, cpu_tier, cpu_cores, cpu_threads, cpu_base_ghz, cpu_boost_ghz) 
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(cpu_model) DO UPDATE SET
+            brandId = excluded.brandId, cpu_tier = excluded.cpu_tier, cpu_cores = excluded.cpu_cores,
+            cpu_threads = excluded.cpu_threads, cpu_base_ghz = excluded.cpu_base_ghz, cpu_boost_ghz = excluded.cpu_boost_ghz
+        WHERE (CPU.brandId, CPU.cpu_tier, CPU.cpu_cores, CPU.cpu_threads, CPU.cpu_base_ghz, CPU.cpu_boost_ghz)
+            IS NOT (excluded.brandId, excluded.cpu_tier, excluded.cpu_cores, excluded.cpu_threads, excluded.cpu_base_ghz, excluded.cpu_boost_ghz)
+    """
+    cur.executemany(query, values)
+    return cur.rowcount
+
+# Insert new GPUs and update ones whose attributes changed. Returns number of rows written
+def upsert_gpus(cur, gpus_set, brand_map):
+    values = gpu_values(gpus_set, brand_map)
+    if not values: return 0
+    query = """
+        INSERT INTO GPU (gpu_model, brandId, gpu_tier, vram_gb) VALUES (?, ?, ?, ?)
+        ON CONFLICT(gpu_model) DO UPDATE SET
+            brandId = excluded.brandId, gpu_tier = excluded.gpu_tier, vram_gb = excluded.vram_gb
+        WHERE (GPU.brandId, GPU.gpu_tier, GPU.vram_gb) IS NOT (excluded.brandId, excluded.gpu_tier, excluded.vram_gb)
+    """
+    cur.executemany(query, values)
+    return cur.rowcount
+
+# Convert a csv row into a Products table tuple
+def product_values(row, brand_id):
+    return (
+        brand_id,
+        row['cpu_model'], row['gpu_model'], row['device_type'], row['model'], 
+        int(row['release_year']) if row['release_year'] else None,
+        row['os'], row['form_factor'], 
+        int(row['ram_gb']) if row['ram_gb'] else None,
+        row['storage_type'], 
+        int(row['storage_gb']) if row['storage_gb'] else None,
+        int(row['storage_drive_count']) if row['storage_drive_count'] else None,
+        row['display_type'], 
+        float(row['display_size_in']) if row['display_size_in'] else None,
+        row['resolution'], 
+        int(row['refresh_hz']) if row['refresh_hz'] else None,
+        int(row['battery_wh']) if row['battery_wh'] else None,
+        int(row['charger_watts']) if row['charger_watts'] else None,
+        int(row['psu_watts']) if row['psu_watts'] else None,
+        row['wifi'], row['bluetooth'], 
+        float(row['weight_kg']) if row['weight_kg'] else None,
+        int(row['warranty_months']) if row['warranty_months'] else None,
+        float(row['price']) if row['price'] else 0.0
+    )
+
 # Insert products into table
-def insert_products(cur, product_rows, brand_map):
-    print(f"Populating Products table ({len(product_rows)} items)...")
-    values = []
-    
-    for row in product_rows:
-        if row['brand'] not in brand_map: continue
-        
-        values.append((
-            brand_map[row['brand']],
-            row['cpu_model'], row['gpu_model'], row['device_type'], row['model'], 
-            int(row['release_year']) if row['release_year'] else None,
-            row['os'], row['form_factor'], 
-            int(row['ram_gb']) if row['ram_gb'] else None,
-            row['storage_type'], 
-            int(row['storage_gb']) if row['storage_gb'] else None,
-            int(row['storage_drive_count']) if row['storage_drive_count'] else None,
-            row['display_type'], 
-            float(row['display_size_in']) if row['display_size_in'] else None,
-            row['resolution'], 
-            int(row['refresh_hz']) if row['refresh_hz'] else None,
-            int(row['battery_wh']) if row['battery_wh'] else None,
-            int(row['charger_watts']) if row['charger_watts'] else None,
-            int(row['psu_watts']) if row['psu_watts'] else None,
-            row['wifi'], row['bluetooth'], 
-            float(row['weight_kg']) if row['weight_kg'] else None,
-            int(row['warranty_months']) if row['warranty_months'] else None,
-            float(row['price']) if row['price'] else 0.0
-        ))
+def insert_products(cur, product_rows, brand_map, verbose=True):
+    if verbose: print(f"Populating Products table ({len(product_rows)} items)...")
+    values = [
+        product_values(row, brand_map[row['brand']])
+        for row in product_rows if row['brand'] in brand_map
+    ]
 
-    if values:
+    write_products(cur, values)
+
+# Insert the brands, CPUs and GPUs of one chunk, given as (brands_set, cpus_set, gpus_set), before the products
+# that reference them. seen is a (cpu models, gpu models) pair of sets this load already wrote, updated in place.
+# With seen=None every CPU and GPU is upserted instead, so changed attributes are written too. backend supplies the
+# insert functions and defaults to this module. Returns the brand map, refreshed when brands were added, and the
+# number of CPU and GPU rows written
+def insert_chunk_entities(cur, chunk_sets, brand_map, seen=None, backend=None):
+    backend = backend or sys.modules[__name__]
+    brands_set, cpus_set, gpus_set = chunk_sets
+    new_brands = brands_set - brand_map.keys()
+    if new_brands:
+        backend.insert_brands(cur, new_brands, verbose=False)
+        brand_map = backend.get_brand_map(cur)
+
+    if seen is None:
+        return brand_map, upsert_cpus(cur, cpus_set, brand_map), upsert_gpus(cur, gpus_set, brand_map)
+
+    seen_cpus, seen_gpus = seen
+    new_cpus = {c for c in cpus_set if c[0] not in seen_cpus}
+    new_gpus = {g for g in gpus_set if g[0] not in seen_gpus}
+    backend.insert_cpus(cur, new_cpus, brand_map, verbose=False)
+    backend.insert_gpus(cur, new_gpus, brand_map, verbose=False)
+    seen_cpus.update(c[0] for c in new_cpus)
+    seen_gpus.update(g[0] for g in new_gpus)
+    return brand_map, len(new_cpus), len(new_gpus)
+
+# Stream the csv into the tables one chunk at a time so memory stays flat regardless of file size.
+# Brands, CPUs and GPUs are inserted as they are first seen, before the products that reference them.
+# backend supplies the insert functions, e.g. pg_functions, and defaults to this module
+def stream_data(cur, csv_filepath, data_limit, chunk_size=CHUNK_SIZE, backend=None):
+    backend = backend or sys.modules[__name__]
+    print(f"Streaming CSV file data in chunks of {chunk_size} rows...")
+    brand_map = backend.get_brand_map(cur)
+    seen = (set(), set())
+    row_count = 0
+
+    for chunk in read_chunks(csv_filepath, data_limit, chunk_size):
+        brands_set = set()
+        cpus_set = set()
+        gpus_set = set()
+        for row in chunk:
+            add_row_entities(row, brands_set, cpus_set, gpus_set)
+        brand_map, _, _ = insert_chunk_entities(cur, (brands_set, cpus_set, gpus_set), brand_map, seen, backend)
+
+        backend.insert_products(cur, chunk, brand_map, verbose=False)
+        row_count += len(chunk)
+        print(f"  {row_count} rows loaded...")
+
+    print("CSV stream complete.\n")
+    return row_count
+
+# Read the csv with pandas in chunks of typed columns. Empty numeric fields become NA while
+# text columns keep their empty strings, matching the row-by-row conversion
+def read_typed_chunks(csv_filepath, data_limit, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+    from collections import defaultdict
+
+    # Integer columns are parsed as floats by the C parser, which is much faster than
+    # parsing straight to nullable Int64, and narrowed back in product_values_columnar
+    numeric = INT_PRODUCT_COLUMNS + FLOAT_PRODUCT_COLUMNS
+    dtypes = defaultdict(lambda: object)
+    dtypes.update({col: 'float64' for col in numeric})
+    return pd.read_csv(
+        csv_filepath, encoding='utf-8', dtype=dtypes, keep_default_na=False,
+        na_values={col: [''] for col in numeric}, float_precision='round_trip',
+        chunksize=chunk_size, nrows=data_limit
+    )
+
+# Convert a typed chunk into Products tuples a column at a time
+def product_values_columnar(chunk, brand_map):
+    brand_ids = chunk['brand'].map(brand_map)
+    keep = brand_ids.notna()
+    chunk = chunk[keep]
+
+    columns = []
+    for col in PRODUCT_COLUMNS:
+        if col == 'brandId':
+            columns.append(brand_ids[keep].astype('int64').tolist())
+        elif col == 'price':
+            columns.append(chunk[col].fillna(0.0).tolist())
+        elif col in INT_PRODUCT_COLUMNS or col in FLOAT_PRODUCT_COLUMNS:
+            series = chunk[col]
+            if col in INT_PRODUCT_COLUMNS:
+                series = series.astype('Int64')
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+        else:
+            columns.append(chunk[col].tolist())
+    return list(zip(*columns))
+
+# Load the csv through the columnar converter, one typed chunk at a time
+def columnar_data(cur, csv_filepath, data_limit, chunk_size=CHUNK_SIZE):
+    print(f"Converting CSV file data in columnar chunks of {chunk_size} rows...")
+    brand_map = get_brand_map(cur)
+    seen = (set(), set())
+    row_count = 0
+    cpu_columns = ['cpu_model', 'cpu_brand', 'cpu_tier', 'cpu_cores', 'cpu_threads', 'cpu_base_ghz', 'cpu_boost_ghz']
+    gpu_columns = ['gpu_model', 'gpu_brand', 'gpu_tier', 'vram_gb']
+
+    for chunk in read_typed_chunks(csv_filepath, data_limit, chunk_size):
+        brands_set = {b for col in ('brand', 'cpu_brand', 'gpu_brand') for b in chunk[col].unique() if b}
+        cpus_set = set(chunk[cpu_columns].drop_duplicates().itertuples(index=False, name=None))
+        gpus_set = set(chunk[gpu_columns].drop_duplicates().itertuples(index=False, name=None))
+        brand_map, _, _ = insert_chunk_entities(cur, (brands_set, cpus_set, gpus_set), brand_map, seen)
+
+        write_products(cur, product_values_columnar(chunk, brand_map))
+        row_count += len(chunk)
+        print(f"  {row_count} rows loaded...")
+
+    print("CSV conversion complete.\n")
+    return row_count
+
+# Split a csv into byte ranges that start and end on line boundaries.
+# Quoted fields containing newlines are not supported. Returns the header line and the ranges
+def shard_csv(csv_filepath, shard_bytes=SHARD_BYTES):
+    size = os.path.getsize(csv_filepath)
+    ranges = []
+    with open(csv_filepath, 'rb') as f:
+        header = f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + shard_bytes, size))
+            f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+# Parse and convert one shard of the csv. Runs in a worker process, so products carry
+# the brand name instead of its id and the writer resolves it while inserting
+def parse_shard(csv_filepath, header, start, end):
+    with open(csv_filepath, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+
+    fieldnames = next(csv.reader([header.decode('utf-8')]))
+    brands_set = set()
+    cpus_set = set()
+    gpus_set = set()
+    products = []
+    row_count = 0
+
+    for row in csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames):
+        add_row_entities(row, brands_set, cpus_set, gpus_set)
+        row_count += 1
+        if row['brand']:
+            products.append(product_values(row, row['brand']))
+    return brands_set, cpus_set, gpus_set, products, row_count
+
+# Parse the csv in a process pool and insert each shard's results in file order from this process.
+# Only a few shards are in flight at once so memory stays bounded. Falls back to streaming when data_limit is set
+def parallel_data(cur, csv_filepath, data_limit, workers=None, shard_bytes=SHARD_BYTES):
+    if data_limit is not None:
+        return stream_data(cur, csv_filepath, data_limit)
+
+    workers = workers or os.cpu_count() or 1
+    header, ranges = shard_csv(csv_filepath, shard_bytes)
+    print(f"Parsing CSV file data in {len(ranges)} shards on {workers} processes...")
+    brand_map = get_brand_map(cur)
+    seen = (set(), set())
+    row_count = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = iter(ranges)
+        pending = deque()
+        for start, end in shards:
+            pending.append(pool.submit(parse_shard, csv_filepath, header, start, end))
+            if len(pending) >= workers * 2: break
+
+        while pending:
+            brands_set, cpus_set, gpus_set, products, shard_rows = pending.popleft().result()
+            next_shard = next(shards, None)
+            if next_shard:
+                pending.append(pool.submit(parse_shard, csv_filepath, header, *next_shard))
+
+            brand_map, _, _ = insert_chunk_entities(cur, (brands_set, cpus_set, gpus_set), brand_map, seen)
+
+            write_products(cur, products, brand_names=True)
+            row_count += shard_rows
+            print(f"  {row_count} rows loaded...")
+
+    print("CSV parse complete.\n")
+    return row_count
+
+# Metadata key holding a resumable import's checkpoint
+CHECKPOINT_KEY = 'import_checkpoint'
+
+# Fields a row needs before its product and its CPU and GPU can reference their brands
+REQUIRED_FIELDS = ('brand', 'model', 'cpu_model', 'cpu_brand', 'gpu_model', 'gpu_brand')
+
+# Checkpoint of an unfinished resumable import of this csv, or None to start from the top.
+# A checkpoint is only used when the path and header match, the file has not shrunk below it and
+# no other import has committed since it was saved
+def find_checkpoint(cur, csv_filepath):
+    try:
+        row = cur.execute("SELECT value FROM Metadata WHERE key = ?", (CHECKPOINT_KEY,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if not row:
+        return None
+    checkpoint = json.loads(row[0])
+    with open(csv_filepath, 'rb') as f:
+        header = f.readline().decode('utf-8', 'replace')
+    if (checkpoint['csv'] != os.path.abspath(csv_filepath) or checkpoint['header'] != header
+            or checkpoint['offset'] > os.path.getsize(csv_filepath)
+            or checkpoint.get('data_version') != get_data_version(cur)):
+        return None
+    return checkpoint
+
+def save_checkpoint(cur, checkpoint):
+    cur.execute("""
+        INSERT INTO Metadata (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (CHECKPOINT_KEY, json.dumps(checkpoint)))
+
+def clear_checkpoint(cur):
+    cur.execute("DELETE FROM Metadata WHERE key = ?", (CHECKPOINT_KEY,))
+
+# Read csv lines from a byte offset in chunks of at most chunk_size rows. Yields the chunk, as
+# (row number, byte offset, raw line) tuples, and the offset just past it. Blank lines are skipped.
+# Quoted fields containing newlines are not supported
+def read_line_chunks(csv_filepath, offset, row_number, data_limit, chunk_size=CHUNK_SIZE):
+    chunk = []
+    with open(csv_filepath, 'rb') as f:
+        f.seek(offset)
+        while data_limit is None or row_number < data_limit:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                row_number += 1
+                chunk.append((row_number, offset, line))
+            offset += len(line)
+            if len(chunk) >= chunk_size:
+                yield chunk, offset
+                chunk = []
+    if chunk:
+        yield chunk, offset
+
+# Parse one raw csv line into a row dict. Raises ValueError for undecodable or misshapen lines
+def parse_line(line, fieldnames):
+    fields = next(csv.reader([line.decode('utf-8').rstrip('\r\n')]))
+    if len(fields) != len(fieldnames):
+        raise ValueError(f"expected {len(fieldnames)} fields, found {len(fields)}")
+    return dict(zip(fieldnames, fields))
+
+# Load the csv in committed chunks, recording the byte offset and row number reached in Metadata with
+# each commit, so a rerun after a crash continues from the last checkpoint. Rows that fail to parse or
+# convert, or would break a foreign key, go to ImportErrors instead of aborting the load. The checkpoint
+# stays at the end of the file until the caller clears it in its final commit. Run it on a connection with
+# at least synchronous = NORMAL so chunk commits survive a crash, and with foreign_keys = ON so rows
+# breaking a foreign key are caught per chunk rather than by the final foreign_key_check
+def resumable_data(conn, csv_filepath, data_limit, chunk_size=CHUNK_SIZE, checkpoint=None):
+    cur = conn.cursor()
+    with open(csv_filepath, 'rb') as f:
+        header = f.readline()
+    fieldnames = next(csv.reader([header.decode('utf-8').rstrip('\r\n')]))
+
+    if checkpoint:
+        print(f"Resuming CSV file data from row {checkpoint['rows']} (byte {checkpoint['offset']})...")
+    else:
+        print(f"Loading CSV file data in checkpointed chunks of {chunk_size} rows...")
+        checkpoint = {
+            'csv': os.path.abspath(csv_filepath), 'header': header.decode('utf-8', 'replace'),
+            'offset': len(header), 'rows': 0, 'quarantined': 0, 'data_version': get_data_version(cur),
+        }
+    resumed_from = checkpoint['rows']
+    brand_map = get_brand_map(cur)
+    seen_cpus = {row[0] for row in cur.execute("SELECT cpu_model FROM CPU")}
+    seen_gpus = {row[0] for row in cur.execute("SELECT gpu_model FROM GPU")}
+
+    for chunk, end_offset in read_line_chunks(csv_filepath, checkpoint['offset'], checkpoint['rows'], data_limit, chunk_size):
+        if not conn.in_transaction:
+            cur.execute("BEGIN")
+        quarantine = []
+        rows = []
+        for row_number, offset, line in chunk:
+            try:
+                row = parse_line(line, fieldnames)
+                missing = [col for col in REQUIRED_FIELDS if not row.get(col)]
+                if missing:
+                    raise ValueError(f"missing {', '.join(missing)}")
+                rows.append((row_number, offset, line, row))
+            except ValueError as e:
+                quarantine.append((row_number, offset, f"{type(e).__name__}: {e}", line))
+
+        brands_set = {row[col] for *_, row in rows for col in ('brand', 'cpu_brand', 'gpu_brand')}
+        if brands_set - brand_map.keys():
+            insert_brands(cur, brands_set - brand_map.keys(), verbose=False)
+            brand_map = get_brand_map(cur)
+
+        # Convert each row's CPU, GPU and product up front, so a bad value quarantines only its row
+        new_cpus = {}
+        new_gpus = {}
+        products = []
+        for row_number, offset, line, row in rows:
+            cpu = row_cpu(row)
+            gpu = row_gpu(row)
+            try:
+                cpu_values([cpu], brand_map)
+                gpu_values([gpu], brand_map)
+                values = product_values(row, brand_map[row['brand']])
+            except ValueError as e:
+                quarantine.append((row_number, offset, f"{type(e).__name__}: {e}", line))
+                continue
+            if cpu[0] not in seen_cpus:
+                new_cpus.setdefault(cpu[0], cpu)
+            if gpu[0] not in seen_gpus:
+                new_gpus.setdefault(gpu[0], gpu)
+            products.append((row_number, offset, line, values))
+
+        insert_cpus(cur, new_cpus.values(), brand_map, verbose=False)
+        insert_gpus(cur, new_gpus.values(), brand_map, verbose=False)
+        seen_cpus.update(new_cpus)
+        seen_gpus.update(new_gpus)
+
+        # Insert the chunk in one go, falling back to row by row to find the rows a constraint rejects
+        cur.execute("SAVEPOINT chunk_products")
+        try:
+            write_products(cur, [values for *_, values in products])
+        except sqlite3.IntegrityError:
+            cur.execute("ROLLBACK TO chunk_products")
+            for row_number, offset, line, values in products:
+                try:
+                    write_products(cur, [values])
+                except sqlite3.IntegrityError as e:
+                    quarantine.append((row_number, offset, f"IntegrityError: {e}", line))
+        cur.execute("RELEASE chunk_products")
+
+        cur.executemany(
+            "INSERT INTO ImportErrors (row_number, byte_offset, reason, raw_row) VALUES (?, ?, ?, ?)",
+            [(n, offset, reason, line.decode('utf-8', 'replace').rstrip('\r\n')) for n, offset, reason, line in quarantine]
+        )
+        checkpoint.update(offset=end_offset, rows=chunk[-1][0], quarantined=checkpoint['quarantined'] + len(quarantine))
+        save_checkpoint(cur, checkpoint)
+        conn.commit()
+        print(f"  {checkpoint['rows']} rows loaded ({checkpoint['quarantined']} quarantined)...")
+
+    print("CSV load complete.\n")
+    return {'rows': checkpoint['rows'], 'resumed_from': resumed_from, 'quarantined': checkpoint['quarantined']}
+
+# Content fingerprint of a Products tuple
+def row_fingerprint(values):
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).hexdigest()
+
+# Identity key of a Products tuple: a hash of the columns that don't change for a product,
+# plus an occurrence number so identical rows within one feed stay distinct
+def row_key(values, occurrences):
+    identity = tuple(v for col, v in zip(PRODUCT_COLUMNS, values) if col not in PRODUCT_MUTABLE_COLUMNS)
+    base = row_fingerprint(identity)
+    n = occurrences.get(base, 0)
+    occurrences[base] = n + 1
+    return f"{base}:{n}"
+
+# Compute keys for products loaded without them (e.g. by a full import), in productId order
+def backfill_product_keys(cur):
+    missing = cur.execute(
+        "SELECT COUNT(*) FROM Products WHERE productId NOT IN (SELECT productId FROM ProductKeys)"
+    ).fetchone()[0]
+    if not missing: return
+
+    # Occurrence numbers depend on every row before them, so rebuild all keys together
+    print(f"Fingerprinting {missing} existing products...")
+    cur.execute("DELETE FROM ProductKeys")
+    occurrences = {}
+    select = f"SELECT productId, {', '.join(PRODUCT_COLUMNS)} FROM Products ORDER BY productId"
+    rows = cur.connection.execute(select)
+    while True:
+        batch = rows.fetchmany(CHUNK_SIZE)
+        if not batch: break
+        cur.executemany(
+            "INSERT INTO ProductKeys (productId, row_key, row_hash) VALUES (?, ?, ?)",
+            [(r[0], row_key(r[1:], occurrences), row_fingerprint(r[1:])) for r in batch]
+        )
+
+# Look up stored (productId, row_hash) for a list of keys
+def lookup_product_keys(cur, keys):
+    found = {}
+    for i in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[i:i + LOOKUP_BATCH]
+        placeholders = ', '.join('?' for _ in batch)
+        cur.execute(f"SELECT row_key, productId, row_hash FROM ProductKeys WHERE row_key IN ({placeholders})", batch)
+        for key, product_id, row_hash in cur.fetchall():
+            found[key] = (product_id, row_hash)
+    return found
+
+# Apply the csv to the existing tables, writing only new or changed rows.
+# Products missing from the feed are deleted when delete_missing is set. Returns the row counts
+def upsert_data(cur, csv_filepath, data_limit, delete_missing=False, chunk_size=CHUNK_SIZE):
+    print("Applying CSV file data incrementally...")
+    ensure_schema(cur)
+    create_indexes(cur)
+    searchable = has_search_index(cur) or build_search_index(cur)
+    backfill_product_keys(cur)
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS FeedKeys (row_key TEXT PRIMARY KEY)")
+    cur.execute("DELETE FROM temp.FeedKeys")
+
+    brand_map = get_brand_map(cur)
+    occurrences = {}
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'cpus': 0, 'gpus': 0}
+    update_sql = f"UPDATE Products SET {', '.join(c + ' = ?' for c in PRODUCT_COLUMNS)} WHERE productId = ?"
+
+    for chunk in read_chunks(csv_filepath, data_limit, chunk_size):
+        brands_set = set()
+        cpus_set = set()
+        gpus_set = set()
+        for row in chunk:
+            add_row_entities(row, brands_set, cpus_set, gpus_set)
+        brand_map, cpus_written, gpus_written = insert_chunk_entities(cur, (brands_set, cpus_set, gpus_set), brand_map)
+        stats['cpus'] += cpus_written
+        stats['gpus'] += gpus_written
+
+        keyed = []
+        for row in chunk:
+            if row['brand'] not in brand_map: continue
+            values = product_values(row, brand_map[row['brand']])
+            keyed.append((row_key(values, occurrences), row_fingerprint(values), values))
+
+        existing = lookup_product_keys(cur, [k[0] for k in keyed])
+        new_keys = []
+        updates = []
+        for key, row_hash, values in keyed:
+            match = existing.get(key)
+            if match is None:
+                cur.execute(INSERT_PRODUCT_SQL, values)
+                new_keys.append((cur.lastrowid, key, row_hash))
+            elif match[1] != row_hash:
+                updates.append((match[0], row_hash, values))
+            else:
+                stats['unchanged'] += 1
+
+        if new_keys:
+            cur.executemany("INSERT INTO ProductKeys (productId, row_key, row_hash) VALUES (?, ?, ?)", new_keys)
+            # New products get consecutive ids. Updates only change mutable columns, which are not indexed
+            if searchable:
+                index_products(cur, new_keys[0][0], new_keys[-1][0])
+        if updates:
+            cur.executemany(update_sql, [values + (product_id,) for product_id, _, values in updates])
+            cur.executemany("UPDATE ProductKeys SET row_hash = ? WHERE productId = ?",
+                            [(row_hash, product_id) for product_id, row_hash, _ in updates])
+        cur.executemany("INSERT INTO temp.FeedKeys (row_key) VALUES (?)", [(k[0],) for k in keyed])
+
+        stats['inserted'] += len(new_keys)
+        stats['updated'] += len(updates)
+        stats['rows'] += len(chunk)
+
+    if delete_missing:
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS MissingProducts AS
+            SELECT productId FROM ProductKeys WHERE row_key NOT IN (SELECT row_key FROM temp.FeedKeys)
+        """)
+        if searchable:
+            unindex_products(cur, "SELECT productId FROM temp.MissingProducts")
+        cur.execute("DELETE FROM ProductKeys WHERE productId IN (SELECT productId FROM temp.MissingProducts)")
+        cur.execute("DELETE FROM Products WHERE productId IN (SELECT productId FROM temp.MissingProducts)")
+        stats['deleted'] = cur.rowcount
+        cur.execute("DROP TABLE temp.MissingProducts")
+
+    print("Incremental apply complete.\n")
+    return stats
+
+# Peak resident memory of this process in MB, or None where the platform can't report it
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# Print throughput and memory for a finished import
+def report_import_stats(row_count, started):
+    elapsed = time.perf_counter() - started
+    rate = row_count / elapsed if elapsed > 0 else 0.0
+    peak = peak_rss_mb()
+    peak_text = f"{peak:.1f} MB" if peak is not None else "n/a"
+    print(f"  Imported {row_count} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec, peak RSS {peak_text})")
+
+# Summary tables import_data materializes so charts don't rescan Products
+SUMMARY_TABLES = (
+    'SummaryBrand', 'SummaryBrandType', 'SummaryCpuTier', 'SummaryTypeStats', 'SummaryPriceHistogram',
+    'SummaryTierDensity', 'SummaryBoxStats', 'SummaryBoxOutliers'
+)
+
+# Bins in the materialized price histogram
+HISTOGRAM_BINS = 20
+
+# Price bins per CPU tier in the materialized price vs CPU tier density grid
+DENSITY_BINS = 40
+
+# Most outliers kept per device type for box plots
+BOX_OUTLIER_LIMIT = 100
+
+# True when every summary table exists, so aggregate queries can read them instead of Products
+def has_summary_tables(cur):
+    placeholders = ', '.join('?' for _ in SUMMARY_TABLES)
+    cur.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})", SUMMARY_TABLES)
+    return cur.fetchone()[0] == len(SUMMARY_TABLES)
+
+# Product filter fields. List fields match any of their values; min_/max_ range fields are inclusive bounds
+FILTER_LIST_FIELDS = ('brand', 'device_type', 'os')
+FILTER_RANGE_FIELDS = ('year', 'price', 'cpu_tier', 'gpu_tier', 'ram')
+
+# Products column each range field bounds. CPU and GPU tiers are matched through the models that have them
+FILTER_RANGE_COLUMNS = {'year': 'release_year', 'price': 'price', 'ram': 'ram_gb'}
+
+# Canonical, hashable form of a product filter such as {'device_type': 'Laptop', 'min_year': 2022, 'max_price': 1500}:
+# sorted (field, value) pairs with list values as sorted tuples and unset fields dropped. Raises ValueError for
+# unknown fields and non-numeric bounds
+def normalize_filter(filters):
+    if not filters:
+        return ()
+    if isinstance(filters, tuple):
+        filters = dict(filters)
+    normalized = []
+    for key, value in filters.items():
+        if value is None:
+            continue
+        if key in FILTER_LIST_FIELDS:
+            values = (value,) if isinstance(value, str) else value
+            normalized.append((key, tuple(sorted({str(v) for v in values}))))
+        elif key.startswith(('min_', 'max_')) and key[4:] in FILTER_RANGE_FIELDS:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Filter bound {key} must be a number, not {value!r}")
+            normalized.append((key, value))
+        else:
+            raise ValueError(f"Unknown filter field: {key}")
+    return tuple(sorted(normalized))
+
+# Compile a normalized filter into SQL conditions on the Products alias and their named parameters.
+# Every condition can be answered from an index on Products, CPU or GPU. With compact the conditions are on
+# ProductData instead: each device type and OS value is looked up in Attributes, so the planner sees one key per
+# value as it would the literal values, and tiers are matched through the model keys
+@functools.lru_cache(maxsize=256)
+def compile_filter(normalized, alias='p', compact=False):
+    conditions = []
+    params = {}
+    for key, value in normalized:
+        if key in FILTER_LIST_FIELDS:
+            names = [f"f_{key}_{i}" for i in range(len(value))]
+            params.update(zip(names, value))
+            placeholders = ", ".join(f":{name}" for name in names)
+            if key == 'brand':
+                conditions.append(f"{alias}.brandId IN (SELECT brandId FROM Brands WHERE brand_name IN ({placeholders}))")
+            elif compact:
+                lookups = ", ".join(f"(SELECT attrId FROM Attributes WHERE name = '{key}' AND value = :{name})" for name in names)
+                conditions.append(f"{alias}.{compact_column(key)} IN ({lookups})")
+            else:
+                conditions.append(f"{alias}.{key} IN ({placeholders})")
+            continue
+
+        params[f"f_{key}"] = value
+        op = ">=" if key.startswith('min_') else "<="
+        field = key[4:]
+        if field == 'cpu_tier' and compact:
+            conditions.append(f"{alias}.cpuId IN (SELECT cpuId FROM CpuModels WHERE cpu_tier {op} :f_{key})")
+        elif field == 'cpu_tier':
+            conditions.append(f"{alias}.cpu_model IN (SELECT cpu_model FROM CPU WHERE cpu_tier {op} :f_{key})")
+        elif field == 'gpu_tier' and compact:
+            conditions.append(f"{alias}.gpuId IN (SELECT gpuId FROM GpuModels WHERE gpu_tier {op} :f_{key})")
+        elif field == 'gpu_tier':
+            conditions.append(f"{alias}.gpu_model IN (SELECT gpu_model FROM GPU WHERE gpu_tier {op} :f_{key})")
+        else:
+            conditions.append(f"{alias}.{FILTER_RANGE_COLUMNS[field]} {op} :f_{key}")
+    return tuple(conditions), params
+
+# WHERE clause joining a query's own conditions with a product filter's, and a fresh dict of the filter's parameters.
+# Pass compact when the query reads ProductData rather than Products
+def where_sql(filters, *conditions, alias='p', compact=False):
+    filter_conditions, params = compile_filter(normalize_filter(filters), alias, compact)
+    conditions = conditions + filter_conditions
+    return ("WHERE " + " AND ".join(conditions) if conditions else ""), dict(params)
+
+# SQL the live chart queries read products through, for the wide and the compact schema. Compact queries read
+# ProductData and CpuModels directly, so filters, joins and groups work on the integer keys. 'device_type' is
+# the column products are grouped by device type on, and 'decode' turns one of its values into the device type
+# name; queries only decode their small grouped results, never a product row. The unary + in the compact CPU
+# join stops a lookup of each product's CPU by rowid, so CpuModels stays the outer table and products are read
+# from the covering (cpuId, device_type_id, price) index, as with the wide schema
+PRODUCT_SOURCES = {
+    False: {
+        'compact': False,
+        'table': 'Products',
+        'device_type': 'device_type',
+        'cpu_join': 'JOIN CPU c ON p.cpu_model = c.cpu_model',
+        'decode': '{}',
+    },
+    True: {
+        'compact': True,
+        'table': 'ProductData',
+        'device_type': 'device_type_id',
+        'cpu_join': 'JOIN CpuModels c ON p.cpuId = +c.cpuId',
+        'decode': '(SELECT value FROM Attributes WHERE attrId = {})',
+    },
+}
+
+# PRODUCT_SOURCES entry for the database's schema
+def product_source(cur):
+    return PRODUCT_SOURCES[is_compact(cur)]
+
+# True when the materialized summary tables can answer a query: no filter and the tables exist
+def use_summary_tables(cur, live, filters):
+    return not live and not normalize_filter(filters) and has_summary_tables(cur)
+
+# Average price per brand, most expensive first
+def query_avg_price_by_brand(cur, limit=None, live=False, filters=None):
+    if use_summary_tables(cur, live, filters):
+        query = "SELECT brand_name, avg_price FROM SummaryBrand ORDER BY avg_price DESC"
+        params = {}
+    else:
+        src = product_source(cur)
+        where, params = where_sql(filters, compact=src['compact'])
+        query = f"""
+            SELECT b.brand_name, AVG(p.price) AS avg_price
+            FROM {src['table']} p
+            JOIN Brands b ON p.brandId = b.brandId
+            {where}
+            GROUP BY b.brand_name
+            ORDER BY avg_price DESC
+        """
+    if limit is not None:
+        return cur.execute(query + " LIMIT :limit", {**params, 'limit': limit}).fetchall()
+    return cur.execute(query, params).fetchall()
+
+# Average price per brand and device type
+def query_avg_price_by_brand_type(cur, live=False, filters=None):
+    if use_summary_tables(cur, live, filters):
+        query = "SELECT brand_name, device_type, avg_price FROM SummaryBrandType ORDER BY brand_name, device_type"
+        return cur.execute(query).fetchall()
+
+    src = product_source(cur)
+    where, params = where_sql(filters, f"p.{src['device_type']} IS NOT NULL", compact=src['compact'])
+    query = f"""
+        SELECT b.brand_name, {src['decode'].format(f"p.{src['device_type']}")} AS device_type, AVG(p.price) AS avg_price
+        FROM {src['table']} p
+        JOIN Brands b ON p.brandId = b.brandId
+        {where}
+        GROUP BY b.brand_name, p.{src['device_type']}
+        ORDER BY b.brand_name, device_type
+    """
+    return cur.execute(query, params).fetchall()
+
+# Product count and average, min and max price per CPU tier
+def query_price_by_cpu_tier(cur, live=False, filters=None):
+    if use_summary_tables(cur, live, filters):
+        query = "SELECT cpu_tier, product_count, avg_price, min_price, max_price FROM SummaryCpuTier ORDER BY cpu_tier"
+        return cur.execute(query).fetchall()
+
+    src = product_source(cur)
+    where, params = where_sql(filters, "c.cpu_tier IS NOT NULL", compact=src['compact'])
+    query = f"""
+        SELECT c.cpu_tier, COUNT(*), AVG(p.price), MIN(p.price), MAX(p.price)
+        FROM {src['table']} p
+        {src['cpu_join']}
+        {where}
+        GROUP BY c.cpu_tier
+        ORDER BY c.cpu_tier
+    """
+    return cur.execute(query, params).fetchall()
+
+# Count, mean, median, min and max price per device type
+def query_price_stats_by_type(cur, live=False, filters=None):
+    if use_summary_tables(cur, live, filters):
         query = """
-            INSERT INTO Products 
-            (brandId, cpu_model, gpu_model, device_type, model, release_year, os, form_factor, ram_gb, storage_type, 
-            storage_gb, storage_drive_count, display_type, display_size_in, resolution, refresh_hz, battery_wh, 
-            charger_watts, psu_watts, wifi, bluetooth, weight_kg, warranty_months, price) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT device_type, product_count, mean_price, median_price, min_price, max_price
+            FROM SummaryTypeStats
+            ORDER BY device_type
         """
-        cur.executemany(query, values)
\ No newline at end of file
+        return cur.execute(query).fetchall()
+
+    src = product_source(cur)
+    where, params = where_sql(filters, f"p.{src['device_type']} IS NOT NULL", compact=src['compact'])
+    query = f"""
+        WITH ranked AS (
+            SELECT p.{src['device_type']} AS device_type, p.price,
+                ROW_NUMBER() OVER (PARTITION BY p.{src['device_type']} ORDER BY p.price) AS rn,
+                COUNT(*) OVER (PARTITION BY p.{src['device_type']}) AS cnt
+            FROM {src['table']} p
+            {where}
+        )
+        SELECT {src['decode'].format('r.device_type')} AS device_type, COUNT(*), AVG(r.price),
+            AVG(CASE WHEN r.rn IN ((r.cnt + 1) / 2, (r.cnt + 2) / 2) THEN r.price END),
+            MIN(r.price), MAX(r.price)
+        FROM ranked r
+        GROUP BY r.device_type
+        ORDER BY device_type
+    """
+    return cur.execute(query, params).fetchall()
+
+# Lowest and highest price, widened when they are equal so bins have a width. None when there are no prices
+def price_bounds(cur, filters=None):
+    src = product_source(cur)
+    where, params = where_sql(filters, compact=src['compact'])
+    low, high = cur.execute(f"SELECT MIN(p.price), MAX(p.price) FROM {src['table']} p {where}", params).fetchone()
+    if low is None:
+        return None
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+# Equal-width price histogram computed like numpy.histogram. Returns (bin_centers, counts)
+def query_price_histogram(cur, bins=HISTOGRAM_BINS, live=False, filters=None):
+    if bins == HISTOGRAM_BINS and use_summary_tables(cur, live, filters):
+        rows = cur.execute("SELECT bin_center, product_count FROM SummaryPriceHistogram ORDER BY bin").fetchall()
+        return [r[0] for r in rows], [r[1] for r in rows]
+
+    bounds = price_bounds(cur, filters)
+    if bounds is None:
+        return [], []
+    low, high = bounds
+
+    src = product_source(cur)
+    where, params = where_sql(filters, "p.price IS NOT NULL", compact=src['compact'])
+    query = f"""
+        SELECT MIN(CAST((p.price - :low) * :bins / :span AS INTEGER), :last_bin) AS bin, COUNT(*)
+        FROM {src['table']} p
+        {where}
+        GROUP BY bin
+    """
+    params.update(low=low, bins=bins, span=high - low, last_bin=bins - 1)
+    counts = [0] * bins
+    for b, count in cur.execute(query, params).fetchall():
+        counts[b] += count
+    width = (high - low) / bins
+    centers = [low + width * (i + 0.5) for i in range(bins)]
+    return centers, counts
+
+# Product counts on a grid of device type x CPU tier x equal-width price bins, for plotting
+# price against CPU tier without sending every product. Returns (device_type, cpu_tier, bin_center, count) rows
+def query_price_density_by_cpu_tier(cur, bins=DENSITY_BINS, live=False, filters=None):
+    if bins == DENSITY_BINS and use_summary_tables(cur, live, filters):
+        query = """
+            SELECT device_type, cpu_tier, bin_center, product_count
+            FROM SummaryTierDensity
+            ORDER BY device_type, cpu_tier, bin_center
+        """
+        return cur.execute(query).fetchall()
+
+    bounds = price_bounds(cur, filters)
+    if bounds is None:
+        return []
+    low, high = bounds
+
+    src = product_source(cur)
+    where, params = where_sql(filters, f"p.{src['device_type']} IS NOT NULL", "c.cpu_tier IS NOT NULL",
+                              "p.price IS NOT NULL", compact=src['compact'])
+    query = f"""
+        SELECT {src['decode'].format(f"p.{src['device_type']}")} AS device_type, c.cpu_tier,
+            MIN(CAST((p.price - :low) * :bins / :span AS INTEGER), :last_bin) AS bin, COUNT(*)
+        FROM {src['table']} p
+        {src['cpu_join']}
+        {where}
+        GROUP BY p.{src['device_type']}, c.cpu_tier, bin
+        ORDER BY device_type, c.cpu_tier, bin
+    """
+    params.update(low=low, bins=bins, span=high - low, last_bin=bins - 1)
+    width = (high - low) / bins
+    return [(device_type, tier, low + width * (b + 0.5), count)
+            for device_type, tier, b, count in cur.execute(query, params).fetchall()]
+
+# SQL for the p-quantile of price within the ranked CTE, interpolated linearly between ranks like numpy's default
+def quantile_sql(p):
+    h = f"(n - 1) * {p}"
+    return f"""SUM(CASE
+                WHEN i = CAST({h} AS INTEGER) THEN price * (1 - ({h} - CAST({h} AS INTEGER)))
+                WHEN i = CAST({h} AS INTEGER) + 1 THEN price * ({h} - CAST({h} AS INTEGER))
+            END)"""
+
+# Quartiles and Tukey fences (1.5 x IQR beyond the quartiles) per device type, over the products of the
+# PRODUCT_SOURCES entry src matching where. Device types are left as src groups them. Ranks come from the
+# (device_type, price) index, so no sort is needed
+def box_fences_cte(where, src):
+    return f"""
+    ranked AS (
+        SELECT p.{src['device_type']} AS device_type, p.price,
+            ROW_NUMBER() OVER (PARTITION BY p.{src['device_type']} ORDER BY p.price) - 1 AS i,
+            COUNT(*) OVER (PARTITION BY p.{src['device_type']}) AS n
+        FROM {src['table']} p
+        {where}
+    ),
+    quartiles AS (
+        SELECT device_type, COUNT(*) AS n,
+            {quantile_sql(0.25)} AS q1,
+            {quantile_sql(0.5)} AS median,
+            {quantile_sql(0.75)} AS q3
+        FROM ranked
+        GROUP BY device_type
+    ),
+    fences AS (
+        SELECT device_type, n, q1, median, q3, q1 - 1.5 * (q3 - q1) AS low, q3 + 1.5 * (q3 - q1) AS high
+        FROM quartiles
+    )
+"""
+
+# Box plot statistics per device type: count, q1, median, q3 and the whisker ends, which are the lowest and
+# highest prices inside the fences. Returns (device_type, count, q1, median, q3, lowerfence, upperfence) rows
+def query_price_box_stats(cur, live=False, filters=None):
+    if use_summary_tables(cur, live, filters):
+        query = """
+            SELECT device_type, product_count, q1, median, q3, lowerfence, upperfence
+            FROM SummaryBoxStats
+            ORDER BY device_type
+        """
+        return cur.execute(query).fetchall()
+
+    src = product_source(cur)
+    device_type = f"p.{src['device_type']}"
+    where, params = where_sql(filters, f"{device_type} IS NOT NULL", "p.price IS NOT NULL", compact=src['compact'])
+    lower_where, _ = where_sql(filters, f"{device_type} = f.device_type", "p.price >= f.low", compact=src['compact'])
+    upper_where, _ = where_sql(filters, f"{device_type} = f.device_type", "p.price <= f.high", compact=src['compact'])
+    query = f"""
+        WITH {box_fences_cte(where, src)}
+        SELECT {src['decode'].format('f.device_type')} AS device_type, f.n, f.q1, f.median, f.q3,
+            (SELECT MIN(p.price) FROM {src['table']} p {lower_where}),
+            (SELECT MAX(p.price) FROM {src['table']} p {upper_where})
+        FROM fences f
+        ORDER BY device_type
+    """
+    return cur.execute(query, params).fetchall()
+
+# Prices outside the box plot fences, at most limit per device type. When there are more, one price is
+# kept from each of limit equal-sized groups so the sample spans the whole range. Returns (device_type, price) rows
+def query_price_box_outliers(cur, limit=BOX_OUTLIER_LIMIT, live=False, filters=None):
+    if limit == BOX_OUTLIER_LIMIT and use_summary_tables(cur, live, filters):
+        return cur.execute("SELECT device_type, price FROM SummaryBoxOutliers ORDER BY device_type, price").fetchall()
+
+    src = product_source(cur)
+    device_type = f"p.{src['device_type']}"
+    where, params = where_sql(filters, f"{device_type} IS NOT NULL", "p.price IS NOT NULL", compact=src['compact'])
+    below_where, _ = where_sql(filters, "p.price < f.low", compact=src['compact'])
+    above_where, _ = where_sql(filters, "p.price > f.high", compact=src['compact'])
+    query = f"""
+        WITH {box_fences_cte(where, src)},
+        outliers AS (
+            SELECT f.device_type, p.price FROM fences f JOIN {src['table']} p ON {device_type} = f.device_type {below_where}
+            UNION ALL
+            SELECT f.device_type, p.price FROM fences f JOIN {src['table']} p ON {device_type} = f.device_type {above_where}
+        ),
+        tiled AS (
+            SELECT device_type, price, NTILE(:limit) OVER (PARTITION BY device_type ORDER BY price) AS tile
+            FROM outliers
+        )
+        SELECT {src['decode'].format('t.device_type')} AS device_type, MIN(t.price) AS price
+        FROM tiled t
+        GROUP BY t.device_type, t.tile
+        ORDER BY device_type, price
+    """
+    params['limit'] = limit
+    return cur.execute(query, params).fetchall()
+
+# Rebuild the summary tables from the current Products data, in one transaction so readers never see them
+# half built. The caller commits
+def build_summary_tables(cur):
+    print("Building summary tables...")
+    if not cur.connection.in_transaction:
+        cur.execute("BEGIN")
+    for table in SUMMARY_TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+
+    cur.execute("""
+        CREATE TABLE SummaryBrand (brand_name TEXT PRIMARY KEY, product_count INTEGER, avg_price REAL)
+    """)
+    src = product_source(cur)
+    cur.execute(f"""
+        INSERT INTO SummaryBrand
+        SELECT b.brand_name, COUNT(*), AVG(p.price)
+        FROM {src['table']} p
+        JOIN Brands b ON p.brandId = b.brandId
+        GROUP BY b.brand_name
+    """)
+
+    cur.execute("""
+        CREATE TABLE SummaryBrandType (
+            brand_name TEXT, device_type TEXT, product_count INTEGER, avg_price REAL,
+            PRIMARY KEY (brand_name, device_type)
+        )
+    """)
+    cur.execute(f"""
+        INSERT INTO SummaryBrandType
+        SELECT b.brand_name, {src['decode'].format(f"p.{src['device_type']}")}, COUNT(*), AVG(p.price)
+        FROM {src['table']} p
+        JOIN Brands b ON p.brandId = b.brandId
+        WHERE p.{src['device_type']} IS NOT NULL
+        GROUP BY b.brand_name, p.{src['device_type']}
+    """)
+
+    cur.execute("""
+        CREATE TABLE SummaryCpuTier (
+            cpu_tier INTEGER PRIMARY KEY, product_count INTEGER, avg_price REAL, min_price REAL, max_price REAL
+        )
+    """)
+    cur.executemany("INSERT INTO SummaryCpuTier VALUES (?, ?, ?, ?, ?)", query_price_by_cpu_tier(cur, live=True))
+
+    cur.execute("""
+        CREATE TABLE SummaryTypeStats (
+            device_type TEXT PRIMARY KEY, product_count INTEGER, mean_price REAL, median_price REAL,
+            min_price REAL, max_price REAL
+        )
+    """)
+    cur.executemany("INSERT INTO SummaryTypeStats VALUES (?, ?, ?, ?, ?, ?)", query_price_stats_by_type(cur, live=True))
+
+    cur.execute("""
+        CREATE TABLE SummaryPriceHistogram (bin INTEGER PRIMARY KEY, bin_center REAL, product_count INTEGER)
+    """)
+    centers, counts = query_price_histogram(cur, live=True)
+    cur.executemany("INSERT INTO SummaryPriceHistogram VALUES (?, ?, ?)",
+                    [(i, center, count) for i, (center, count) in enumerate(zip(centers, counts))])
+
+    cur.execute("""
+        CREATE TABLE SummaryTierDensity (
+            device_type TEXT, cpu_tier INTEGER, bin_center REAL, product_count INTEGER,
+            PRIMARY KEY (device_type, cpu_tier, bin_center)
+        )
+    """)
+    cur.executemany("INSERT INTO SummaryTierDensity VALUES (?, ?, ?, ?)", query_price_density_by_cpu_tier(cur, live=True))
+
+    cur.execute("""
+        CREATE TABLE SummaryBoxStats (
+            device_type TEXT PRIMARY KEY, product_count INTEGER, q1 REAL, median REAL, q3 REAL,
+            lowerfence REAL, upperfence REAL
+        )
+    """)
+    cur.executemany("INSERT INTO SummaryBoxStats VALUES (?, ?, ?, ?, ?, ?, ?)", query_price_box_stats(cur, live=True))
+
+    cur.execute("CREATE TABLE SummaryBoxOutliers (device_type TEXT, price REAL)")
+    cur.executemany("INSERT INTO SummaryBoxOutliers VALUES (?, ?)", query_price_box_outliers(cur, live=True))
+
+# Compare two query results, allowing for float rounding
+def rows_match(a, b):
+    if len(a) != len(b): return False
+    for x, y in zip(a, b):
+        if isinstance(x, (tuple, list)):
+            if not isinstance(y, (tuple, list)) or not rows_match(x, y): return False
+        elif isinstance(x, float) or isinstance(y, float):
+            if x is None or y is None or abs(x - y) > 1e-9 * max(1.0, abs(x)): return False
+        elif x != y:
+            return False
+    return True
+
+# Compare each summary table with a live aggregate over Products. Returns the names of stale tables
+def verify_summary_tables(cur):
+    if not has_summary_tables(cur):
+        return list(SUMMARY_TABLES)
+
+    # Brands are compared by name so ties in the price ranking can't cause false alarms
+    checks = {
+        'SummaryBrand': lambda live: sorted(query_avg_price_by_brand(cur, live=live)),
+        'SummaryBrandType': lambda live: query_avg_price_by_brand_type(cur, live=live),
+        'SummaryCpuTier': lambda live: query_price_by_cpu_tier(cur, live=live),
+        'SummaryTypeStats': lambda live: query_price_stats_by_type(cur, live=live),
+        'SummaryPriceHistogram': lambda live: query_price_histogram(cur, live=live),
+        'SummaryTierDensity': lambda live: query_price_density_by_cpu_tier(cur, live=live),
+        'SummaryBoxStats': lambda live: query_price_box_stats(cur, live=live),
+        'SummaryBoxOutliers': lambda live: query_price_box_outliers(cur, live=live),
+    }
+    return [table for table, check in checks.items() if not rows_match(check(False), check(True))]
+
+# Tables too large to scan without an index
+LARGE_TABLES = ('Products', 'ProductData')
+
+# Typical drill-down filter the filtered chart queries are checked with
+PLAN_CHECK_FILTER = {'device_type': 'Laptop', 'min_year': 2022, 'max_price': 1500}
+
+# Chart queries whose plans check_query_plans inspects. Each is run live so the checked SQL is exactly what runs
+PLAN_CHECKS = [
+    ('avg_price_by_brand', lambda cur: query_avg_price_by_brand(cur, live=True)),
+    ('avg_price_by_brand_type', lambda cur: query_avg_price_by_brand_type(cur, live=True)),
+    ('price_by_cpu_tier', lambda cur: query_price_by_cpu_tier(cur, live=True)),
+    ('price_stats_by_type', lambda cur: query_price_stats_by_type(cur, live=True)),
+    ('price_histogram', lambda cur: query_price_histogram(cur, live=True)),
+    ('price_density_by_cpu_tier', lambda cur: query_price_density_by_cpu_tier(cur, live=True)),
+    ('price_box_stats', lambda cur: query_price_box_stats(cur, live=True)),
+    ('price_box_outliers', lambda cur: query_price_box_outliers(cur, live=True)),
+    ('avg_price_by_brand (filtered)', lambda cur: query_avg_price_by_brand(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('avg_price_by_brand_type (filtered)', lambda cur: query_avg_price_by_brand_type(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_by_cpu_tier (filtered)', lambda cur: query_price_by_cpu_tier(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_stats_by_type (filtered)', lambda cur: query_price_stats_by_type(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_histogram (filtered)', lambda cur: query_price_histogram(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_density_by_cpu_tier (filtered)', lambda cur: query_price_density_by_cpu_tier(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_box_stats (filtered)', lambda cur: query_price_box_stats(cur, live=True, filters=PLAN_CHECK_FILTER)),
+    ('price_box_outliers (filtered)', lambda cur: query_price_box_outliers(cur, live=True, filters=PLAN_CHECK_FILTER)),
+]
+
+# Run EXPLAIN QUERY PLAN on every statement the PLAN_CHECKS queries execute.
+# Returns (check name, plan detail) for each full scan of a large table; an empty list means all plans use indexes
+def check_query_plans(conn):
+    violations = []
+    for name, run in PLAN_CHECKS:
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            run(conn.cursor())
+        finally:
+            conn.set_trace_callback(None)
+
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')): continue
+            # Map aliases back to table names so "SCAN p" is recognised as a scan of Products
+            aliases = {}
+            for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+                aliases[table] = table
+                if alias and alias.upper() not in ('JOIN', 'WHERE', 'ON', 'GROUP', 'ORDER', 'LEFT', 'INNER', 'LIMIT'):
+                    aliases[alias] = table
+            for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall():
+                detail = row[3]
+                match = re.match(r'SCAN (\w+)', detail)
+                if match and 'USING' not in detail and aliases.get(match.group(1), match.group(1)) in LARGE_TABLES:
+                    violations.append((name, detail))
+    return violations
@@ -1,55 +1,173 @@
+import argparse
 import os
 import sys
+import time
 import db_functions as db
-import chart_functions as charts
+import trace_functions as trace
+
+# chart_functions pulls in pandas and plotly, so it is imported by the chart commands that need it
 
 DB_NAME = "computers.db"
 CSV_PATH = "computer_prices_all.csv" 
 
+# "full" reads the whole csv before inserting, "stream" loads it in fixed-size chunks,
+# "parallel" parses csv shards in a process pool, "columnar" converts whole columns
+# with pandas, "incremental" keeps the existing
+# tables and only writes new or changed rows, "resumable" commits in checkpointed
+# chunks, quarantines bad rows and continues an interrupted load on rerun
+IMPORT_MODE = "full"
+
+# Worker processes for parallel imports (None uses every core)
+IMPORT_WORKERS = None
+
+# Incremental imports delete products that are no longer in the csv when set
+DELETE_MISSING = False
+
+# Load with the bulk-load connection profile inside a single transaction
+BULK_LOAD = True
+
+# Full reloads create the compact schema: integer CPU/GPU keys and dictionary-coded attributes behind
+# views with the usual Products, CPU and GPU columns. Incremental imports need the default schema
+COMPACT_SCHEMA = False
+
+# Record per-stage timings and write them to TRACE_PATH on exit (Chrome trace format).
+# Stages named in PROFILE_STAGES also run under cProfile, e.g. {"insert_products"}
+TRACE = False
+TRACE_PATH = "trace.json"
+PROFILE_STAGES = set()
+
+# Where export_charts writes figures, and whether as "html" pages or figure "json"
+EXPORT_DIR = "exports"
+EXPORT_FORMAT = "html"
+
+# Address serve_charts listens on
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8050
+
 # Load csv data into database
-def import_data():
-    if not os.path.exists(CSV_PATH):
-        print(f"Error: The file '{CSV_PATH}' was not found.")
+def import_data(mode=IMPORT_MODE, chunk_size=db.CHUNK_SIZE, delete_missing=DELETE_MISSING, bulk=BULK_LOAD,
+                workers=IMPORT_WORKERS, csv_path=None, db_name=None, compact=COMPACT_SCHEMA):
+    csv_path = csv_path or CSV_PATH
+    db_name = db_name or DB_NAME
+    if not os.path.exists(csv_path):
+        print(f"Error: The file '{csv_path}' was not found.")
         return False
 
-    print(f"Connecting to local SQLite database: {DB_NAME}...")
+    # PostgreSQL URLs load through pg_functions, anything else is a SQLite file
+    backend = db.get_backend(db_name)
+    sqlite = backend is db
+    print(f"Connecting to local SQLite database: {db_name}..." if sqlite else "Connecting to PostgreSQL database...")
 
     try:
-        conn = db.getconn(DB_NAME)
+        conn = backend.getconn(db_name, bulk=bulk)
         cur = conn.cursor()
     except Exception as e:
         print(f"Connection failed: {e}")
         return False
 
     try:
-        # Create table schemata
-        db.setup_db(cur)
-        conn.commit()
-
         data_limit = None
-        
-        # Read in table data from the csv
-        brands, cpus, gpus, products = db.read_data(CSV_PATH, data_limit)
+        started = time.perf_counter()
+        with trace.stage('import_data', mode=mode) as import_info:
+            if not sqlite and mode not in backend.IMPORT_MODES:
+                raise ValueError(f"PostgreSQL imports support the {' and '.join(backend.IMPORT_MODES)} modes, not {mode}")
+            if mode == "incremental" and (compact or db.is_compact(cur)):
+                raise ValueError("Incremental imports need the default schema; run a full import without the compact schema first")
+            checkpoint = db.find_checkpoint(cur, csv_path) if mode == "resumable" else None
+            if mode == "resumable":
+                # Chunk commits must survive a crash; under WAL, NORMAL is enough and much cheaper than FULL.
+                # Foreign keys stay on, even with the bulk profile, so rows breaking one are quarantined
+                conn.execute("PRAGMA synchronous = NORMAL;")
+                conn.execute("PRAGMA foreign_keys = ON;")
+            if bulk:
+                backend.begin_bulk_load(conn)
 
-        # Insert csv data into tables
-        db.insert_brands(cur, brands)
-        conn.commit()
-        brand_map = db.get_brand_map(cur)
-        db.insert_cpus(cur, cpus, brand_map)
-        db.insert_gpus(cur, gpus, brand_map)
-        db.insert_products(cur, products, brand_map)
-        conn.commit()
-        print("SUCCESS: All data imported into 'computers.db'")
+            if mode != "incremental" and checkpoint is None:
+                # Create table schemata
+                with trace.stage('setup_db'):
+                    backend.setup_db(cur, compact)
+
+            if mode == "incremental":
+                # Upsert the csv into the existing tables
+                with trace.stage('upsert_data') as info:
+                    stats = db.upsert_data(cur, csv_path, data_limit, delete_missing, chunk_size)
+                    row_count = info['rows'] = stats['rows']
+                print(f"  Inserted:  {stats['inserted']}")
+                print(f"  Updated:   {stats['updated']}")
+                print(f"  Unchanged: {stats['unchanged']}")
+                print(f"  Deleted:   {stats['deleted']}")
+                print(f"  CPU/GPU rows written: {stats['cpus']}/{stats['gpus']}")
+            elif mode == "resumable":
+                # Load in committed chunks, continuing from the last checkpoint
+                with trace.stage('resumable_data') as info:
+                    stats = db.resumable_data(conn, csv_path, data_limit, chunk_size, checkpoint)
+                    row_count = info['rows'] = stats['rows'] - stats['resumed_from']
+                if stats['resumed_from']:
+                    print(f"  Resumed after row {stats['resumed_from']}")
+                print(f"  Quarantined: {stats['quarantined']} rows (see the ImportErrors table)")
+            elif mode == "parallel":
+                # Parse csv shards in worker processes and insert them from here
+                with trace.stage('parallel_data') as info:
+                    row_count = info['rows'] = db.parallel_data(cur, csv_path, data_limit, workers)
+            elif mode == "columnar":
+                # Convert typed csv chunks a column at a time
+                with trace.stage('columnar_data') as info:
+                    row_count = info['rows'] = db.columnar_data(cur, csv_path, data_limit, chunk_size)
+            elif mode == "stream":
+                # Read and insert the csv chunk by chunk
+                with trace.stage('stream_data') as info:
+                    row_count = info['rows'] = backend.stream_data(cur, csv_path, data_limit, chunk_size)
+            else:
+                # Read in table data from the csv
+                with trace.stage('read_data') as info:
+                    brands, cpus, gpus, products = db.read_data(csv_path, data_limit)
+                    row_count = info['rows'] = len(products)
+
+                # Insert csv data into tables
+                with trace.stage('insert_brands', rows=len(brands)):
+                    backend.insert_brands(cur, brands)
+                brand_map = backend.get_brand_map(cur)
+                with trace.stage('insert_cpus', rows=len(cpus)):
+                    backend.insert_cpus(cur, cpus, brand_map)
+                with trace.stage('insert_gpus', rows=len(gpus)):
+                    backend.insert_gpus(cur, gpus, brand_map)
+                with trace.stage('insert_products', rows=len(products)):
+                    backend.insert_products(cur, products, brand_map)
+
+            # An incremental load that wrote nothing leaves the summary tables and statistics as they are
+            changed = mode != "incremental" or any(stats[k] for k in ('inserted', 'updated', 'deleted', 'cpus', 'gpus'))
+            if mode != "incremental":
+                with trace.stage('create_indexes'):
+                    backend.create_indexes(cur)
+                if sqlite:
+                    with trace.stage('build_search_index'):
+                        db.build_search_index(cur)
+                backend.bump_data_version(cur)
+                if mode == "resumable":
+                    db.clear_checkpoint(cur)
+            elif changed:
+                db.bump_data_version(cur)
+
+            # Materialize the chart aggregates in the load transaction, so readers see the new
+            # data, its summary tables and its data version together. Charts and search read
+            # SQLite, so a PostgreSQL load stops at the tables and indexes
+            if sqlite and changed:
+                with trace.stage('build_summary_tables'):
+                    db.build_summary_tables(cur)
+
+            with trace.stage('commit'):
+                if bulk:
+                    backend.finish_bulk_load(conn, changed)
+                else:
+                    conn.commit()
+            print(f"SUCCESS: All data imported into '{db_name}'" if sqlite else "SUCCESS: All data imported into PostgreSQL")
+            import_info['rows'] = row_count
 
         # Query the counts from all tables for display
-        brands_count = cur.execute("SELECT COUNT(*) FROM Brands").fetchone()[0]
-        cpus_count = cur.execute("SELECT COUNT(*) FROM CPU").fetchone()[0]
-        gpus_count = cur.execute("SELECT COUNT(*) FROM GPU").fetchone()[0]
-        products_count = cur.execute("SELECT COUNT(*) FROM Products").fetchone()[0]
-        print(f"  Brands:   {brands_count}")
-        print(f"  CPUs:     {cpus_count}")
-        print(f"  GPUs:     {gpus_count}")
-        print(f"  Products: {products_count}")
+        for label, table in (("Brands", "Brands"), ("CPUs", "CPU"), ("GPUs", "GPU"), ("Products", "Products")):
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            print(f"  {label + ':':<9} {cur.fetchone()[0]}")
+        db.report_import_stats(row_count, started)
         
         return True
 
@@ -61,73 +179,159 @@ def import_data():
     finally:
         cur.close()
         conn.close()
+        # Cached chart data no longer matches the database
+        if session is not None:
+            session.invalidate()
+
+# Analysis session shared by every chart action until the program exits
+session = None
+
+# Get the shared analysis session, creating it on first use. Its cached data is dropped when the
+# database has been reloaded since, including by another process
+def get_session():
+    global session
+    import chart_functions as charts
+    if session is None or session.db_name != DB_NAME:
+        if session is not None:
+            session.close()
+        session = charts.AnalysisSession(DB_NAME)
+    session.sync()
+    return session
+
+# Load product columns into the session and report their size
+def load_products(session, columns, filters=None):
+    import chart_functions as charts
+    print("Loading data from database...")
+    df = session.frame(columns, filters=filters)
+    print(f"Loaded {len(df)} products ({charts.frame_memory_mb(df):.2f} MB).\n")
+
+# Rebuild the chart summary tables, or only report which ones are stale
+def refresh_summary_tables(verify_only=False):
+    if not os.path.exists(DB_NAME):
+        print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
+        return False
+
+    conn = db.getconn(DB_NAME)
+    try:
+        cur = conn.cursor()
+        stale = db.verify_summary_tables(cur)
+        if not stale:
+            print("Summary tables are up to date.")
+            return True
+        print(f"Stale summary tables: {', '.join(stale)}")
+        if verify_only:
+            return False
+        db.build_summary_tables(cur)
+        conn.commit()
+        if session is not None:
+            session.invalidate()
+        print("Summary tables rebuilt.")
+        return True
+    finally:
+        conn.close()
 
-# Show all table visualizations on one page
-def show_dashboard():
+# Show all table visualizations on one page, optionally for only the products matching filters
+def show_dashboard(filters=None):
+    import chart_functions as charts
     if not os.path.exists(DB_NAME):
         print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
         return
 
-    print(f"Connecting to database: {DB_NAME}...")
-    
     try:
-        conn = db.getconn(DB_NAME)
-        
-        print("Loading data from database...")
-        df = charts.get_products_dataframe(conn)
-        print(f"Loaded {len(df)} products.\n")
-        
         print("Generating dashboard...")
-        charts.show_dashboard(df)
+        charts.show_dashboard(get_session(), filters)
         
         print("\nDashboard displayed in your browser!")
         
     except Exception as e:
         print(f"Error generating dashboard: {e}")
-    
-    finally:
-        conn.close()
 
 # Display each table visualization on its own page
-def show_visualizations():
+def show_visualizations(filters=None):
+    import chart_functions as charts
     if not os.path.exists(DB_NAME):
         print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
         return
 
-    print(f"Connecting to database: {DB_NAME}...")
-    
     try:
-        conn = db.getconn(DB_NAME)
-        
-        print("Loading data from database...")
-        df = charts.get_products_dataframe(conn)
-        print(f"Loaded {len(df)} products.\n")
-        
+        session = get_session()
         print("Generating visualizations...\n")
         
         print("1. Price Distribution Histogram")
-        charts.show_price_histogram(df)
+        charts.show_price_histogram(session, filters)
         
         print("2. Average Price by Brand")
-        charts.show_avg_price_by_brand(df)
+        charts.show_avg_price_by_brand(session, filters)
         
         print("3. Average Price Grouped by Type")
-        charts.show_avg_price_grouped(df)
+        charts.show_avg_price_grouped(session, filters)
+        
+        # Only the scatter plots individual products, and only while it is not drawn as a density grid
+        if session.scatter_mode(filters) != 'density':
+            load_products(session, charts.CHART_COLUMNS['tier-price'], filters)
         
         print("4. Price vs CPU Tier")
-        charts.show_price_vs_cpu_tier(df)
+        charts.show_price_vs_cpu_tier(session, filters)
         
         print("5. Price Distribution: Laptop vs Desktop")
-        charts.show_box_price_by_type(df)
+        charts.show_box_price_by_type(session, filters)
         
         print("\nAll visualizations displayed!")
         
     except Exception as e:
         print(f"Error generating visualizations: {e}")
-    
+
+# Write every chart and the dashboard to EXPORT_DIR without opening a browser
+def export_charts(out_dir=EXPORT_DIR, fmt=EXPORT_FORMAT, workers=None, force=False):
+    import chart_functions as charts
+    if not os.path.exists(DB_NAME):
+        print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
+        return False
+
+    try:
+        started = time.perf_counter()
+        built, skipped = charts.export_figures(DB_NAME, out_dir, fmt, workers=workers, force=force)
+        print(f"Exported {len(built)} figures to {out_dir} in {time.perf_counter() - started:.2f}s"
+              + (f" ({len(skipped)} unchanged, skipped)" if skipped else ""))
+        return True
+    except Exception as e:
+        print(f"Error exporting charts: {e}")
+        return False
+
+# Print the products best matching a model, brand, CPU or GPU search
+def search_products(text, limit=20):
+    if not os.path.exists(DB_NAME):
+        print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
+        return False
+
+    conn = db.getconn_readonly(DB_NAME)
+    try:
+        started = time.perf_counter()
+        rows = db.search_products(conn.cursor(), text, limit)
+        elapsed = time.perf_counter() - started
     finally:
         conn.close()
 
+    for product_id, model, brand, device_type, cpu_model, cpu_tier, gpu_model, gpu_tier, price, _ in rows:
+        print(f"  {product_id:>10} {brand:<10} {model:<28} {device_type or '':<8} "
+              f"{cpu_model} (tier {cpu_tier}) / {gpu_model} (tier {gpu_tier})  ${price:,.2f}")
+    print(f"{len(rows)} products in {elapsed * 1000:.1f} ms")
+    return True
+
+# Serve the dashboard and each chart as figure JSON over HTTP until interrupted
+def serve_charts(host=SERVER_HOST, port=SERVER_PORT):
+    import server_functions as server
+    if not os.path.exists(DB_NAME):
+        print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
+        return False
+
+    try:
+        server.serve(DB_NAME, host, port)
+        return True
+    except Exception as e:
+        print(f"Error serving charts: {e}")
+        return False
+
 # Main menu selection
 def show_menu():
     print("Computer Price Analysis")
@@ -135,9 +339,11 @@ def show_menu():
     print("2. Show dashboard (all charts in one window)")
     print("3. Show all visualizations (separate windows)")
     print("4. Show specific chart")
-    print("5. Exit")
+    print("5. Export charts")
+    print("6. Serve charts over HTTP")
+    print("7. Exit")
     
-    choice = input("\nEnter your choice (1-5): ").strip()
+    choice = input("\nEnter your choice (1-7): ").strip()
     return choice
 
 # Individual chart selection
@@ -153,38 +359,144 @@ def show_chart_menu():
     return choice
 
 # Display single chart
-def show_single_chart(chart_num):
+def show_single_chart(chart_num, filters=None):
+    import chart_functions as charts
     if not os.path.exists(DB_NAME):
         print(f"Error: Database '{DB_NAME}' not found. Please import data first.")
         return
     
     try:
-        conn = db.getconn(DB_NAME)
-        
-        print("Loading data from database...")
-        df = charts.get_products_dataframe(conn)
-        print(f"Loaded {len(df)} products.\n")
+        session = get_session()
         
         if chart_num == '1':
-            charts.show_price_histogram(df)
+            charts.show_price_histogram(session, filters)
         elif chart_num == '2':
-            charts.show_avg_price_by_brand(df)
+            charts.show_avg_price_by_brand(session, filters)
         elif chart_num == '3':
-            charts.show_avg_price_grouped(df)
+            charts.show_avg_price_grouped(session, filters)
         elif chart_num == '4':
-            charts.show_price_vs_cpu_tier(df)
+            if session.scatter_mode(filters) != 'density':
+                load_products(session, charts.CHART_COLUMNS['tier-price'], filters)
+            charts.show_price_vs_cpu_tier(session, filters)
         elif chart_num == '5':
-            charts.show_box_price_by_type(df)
+            charts.show_box_price_by_type(session, filters)
         else:
             print("Invalid chart number.")
             
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        conn.close()
+
+# Chart names accepted on the command line, mapped to their chart menu numbers
+CHART_OPTIONS = {
+    'frequency-price': '1',
+    'price': '2',
+    'grouped-price': '3',
+    'tier-price': '4',
+    'boxed-price': '5',
+}
+
+IMPORT_MODES = ("full", "stream", "parallel", "columnar", "incremental", "resumable")
+
+# Product filter from --filter FIELD=VALUE arguments, e.g. device_type=Laptop min_year=2022 brand=HP,Dell.
+# List fields take comma-separated values; min_/max_ bounds are numbers
+def parse_filter(items):
+    filters = {}
+    for item in items or ():
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Filter must look like FIELD=VALUE, not {item!r}")
+        if key in db.FILTER_LIST_FIELDS:
+            filters[key] = value.split(",")
+        elif not (key.startswith(("min_", "max_")) and key[4:] in db.FILTER_RANGE_FIELDS):
+            raise argparse.ArgumentTypeError(f"Unknown filter field: {key}")
+        else:
+            try:
+                filters[key] = float(value) if "." in value else int(value)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"Filter bound {key} must be a number, not {value!r}")
+    return filters
+
+# Command line arguments. Without a command the interactive menu runs
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Computer price analysis")
+    parser.add_argument("--db", default=DB_NAME, help="SQLite database file, or a postgresql:// URL for imports")
+    parser.add_argument("--chart", choices=['all'] + list(CHART_OPTIONS), help="Show one chart, or all of them on separate pages")
+    parser.add_argument("--trace", metavar="PATH", help="Record stage timings and write a Chrome trace to PATH on exit")
+    parser.add_argument("--filter", action="append", metavar="FIELD=VALUE",
+                        help="Only chart matching products, e.g. device_type=Laptop min_year=2022 max_price=1500 (repeatable)")
+    commands = parser.add_subparsers(dest="command")
+
+    import_parser = commands.add_parser("import", help="Load the csv into the database")
+    import_parser.add_argument("--csv", default=CSV_PATH, help="Csv file to load")
+    import_parser.add_argument("--mode", choices=IMPORT_MODES, default=IMPORT_MODE, help="How the csv is loaded")
+    import_parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Worker processes for parallel imports")
+    import_parser.add_argument("--chunk-size", type=int, default=db.CHUNK_SIZE, help="Rows per chunk for chunked imports")
+    import_parser.add_argument("--delete-missing", action="store_true", default=DELETE_MISSING,
+                               help="Incremental imports delete products that are no longer in the csv")
+    import_parser.add_argument("--no-bulk", dest="bulk", action="store_false", default=BULK_LOAD,
+                               help="Load with the default connection profile instead of the bulk-load one")
+    import_parser.add_argument("--compact", action="store_true", default=COMPACT_SCHEMA,
+                               help="Create the compact integer-keyed schema")
+
+    commands.add_parser("dashboard", help="Show all charts on one page")
+
+    chart_parser = commands.add_parser("chart", help="Show one chart, or all of them on separate pages")
+    chart_parser.add_argument("name", choices=['all'] + list(CHART_OPTIONS))
+
+    export_parser = commands.add_parser("export", help="Write the charts and dashboard to a directory")
+    export_parser.add_argument("--out", default=EXPORT_DIR, help="Export directory")
+    export_parser.add_argument("--format", choices=("html", "json"), default=EXPORT_FORMAT, help="Page or figure JSON output")
+    export_parser.add_argument("--workers", type=int, help="Worker processes building figures")
+    export_parser.add_argument("--force", action="store_true", help="Rebuild figures even if the data has not changed")
+
+    search_parser = commands.add_parser("search", help="Find products by model, brand, CPU or GPU name")
+    search_parser.add_argument("text", nargs="+", help="Words to match; the last one may be a prefix")
+    search_parser.add_argument("--limit", type=int, default=20, help="Most products to list")
+
+    serve_parser = commands.add_parser("serve", help="Serve the dashboard and charts as figure JSON over HTTP")
+    serve_parser.add_argument("--host", default=SERVER_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+
+    args = parser.parse_args(argv)
+    try:
+        args.filters = parse_filter(args.filter)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.chart and args.command:
+        parser.error("--chart cannot be combined with a command")
+    if args.chart:
+        args.command, args.name = "chart", args.chart
+    return args
+
+# Run one command from the command line. Returns False when it failed
+def run_command(args):
+    global DB_NAME
+    DB_NAME = args.db
+    if args.trace or TRACE:
+        trace.enable(args.trace or TRACE_PATH, PROFILE_STAGES)
+
+    if args.command == "import":
+        return import_data(args.mode, args.chunk_size, args.delete_missing, args.bulk, args.workers, args.csv,
+                           compact=args.compact)
+    if args.command == "dashboard":
+        show_dashboard(args.filters)
+    elif args.command == "chart" and args.name == "all":
+        show_visualizations(args.filters)
+    elif args.command == "chart":
+        show_single_chart(CHART_OPTIONS[args.name], args.filters)
+    elif args.command == "export":
+        return export_charts(args.out, args.format, args.workers, args.force)
+    elif args.command == "search":
+        return search_products(" ".join(args.text), args.limit)
+    elif args.command == "serve":
+        return serve_charts(args.host, args.port)
+    return True
 
 # Main function loop
 def main():
+    if TRACE:
+        trace.enable(TRACE_PATH, PROFILE_STAGES)
+
     while True:
         choice = show_menu()
         
@@ -198,10 +510,16 @@ def main():
             chart_choice = show_chart_menu()
             show_single_chart(chart_choice)
         elif choice == '5':
+            export_charts()
+        elif choice == '6':
+            serve_charts()
+        elif choice == '7':
             print("\nExiting... Goodbye!")
             sys.exit(0)
         else:
             print("Invalid choice. Please try again.")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(0 if run_command(parse_args()) else 1)
     main()
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Functions for serving the charts over HTTP as figure JSON
+"""
+
+import hashlib
+import json
+import re
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import chart_functions as charts
+
+# Page that loads the dashboard, or the chart named in the address hash, from the figure JSON endpoints
+INDEX_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Computer Price Analysis</title>
+<script src="/plotly.min.js"></script>
+<style>body {{ font-family: sans-serif; margin: 0 1em; }} nav a {{ margin-right: 1em; }}</style>
+</head>
+<body>
+<nav>{links}</nav>
+<div id="figure"></div>
+<script>
+function load() {{
+    const name = location.hash.slice(1) || "dashboard";
+    fetch("/figures/" + name + ".json")
+        .then(response => response.json())
+        .then(fig => Plotly.react("figure", fig.data, fig.layout));
+}}
+window.addEventListener("hashchange", load);
+load();
+</script>
+</body>
+</html>
+"""
+
+FIGURE_PATH = re.compile(r"^/figures/([\w-]+)\.json$")
+
+# Figure JSON per chart, built once per data version and shared by every request. Concurrent
+# requests for the same figure wait for a single build through the session's memo. Each request
+# borrows a read connection from the session's pool and hands it back when done, so the
+# per-request handler threads reuse a few connections rather than each opening one
+class FigureCache:
+    def __init__(self, db_name):
+        self.session = charts.AnalysisSession(db_name)
+        self.lock = threading.Lock()
+        self.plotly_js = None
+
+    # (ETag, JSON body) of a figure for the current data version. Raises KeyError for unknown figures
+    def get(self, name):
+        builder = charts.FIGURE_BUILDERS[name]
+        try:
+            self.session.sync()
+            version = self.session.version
+            return self.session.memo(('figure_json', name, version), lambda: self.build(name, builder, version))
+        finally:
+            self.session.connections.release()
+
+    def build(self, name, builder, version):
+        body = builder(self.session).to_json().encode('utf-8')
+        # Databases imported before data versions were recorded fall back to a content hash
+        tag = version or hashlib.blake2b(body, digest_size=16).hexdigest()
+        return f'"{name}-{tag}"', body
+
+    # Minified plotly.js, read from the plotly package once
+    def plotly_script(self):
+        with self.lock:
+            if self.plotly_js is None:
+                from plotly.offline import get_plotlyjs
+                self.plotly_js = get_plotlyjs().encode('utf-8')
+            return self.plotly_js
+
+    def close(self):
+        self.session.close()
+
+# True when an If-None-Match header value matches etag
+def etag_matches(header, etag):
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ComputerPrices/1.0"
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path in ('/', '/index.html'):
+            links = " ".join(f'<a href="#{name}">{name}</a>' for name in charts.FIGURE_BUILDERS)
+            return self.send_body(INDEX_PAGE.format(links=links).encode('utf-8'), 'text/html; charset=utf-8')
+        if path == '/plotly.min.js':
+            return self.send_body(self.server.figures.plotly_script(), 'application/javascript',
+                                  cache_control='public, max-age=86400')
+        if path == '/figures':
+            names = json.dumps(list(charts.FIGURE_BUILDERS)).encode('utf-8')
+            return self.send_body(names, 'application/json')
+
+        match = FIGURE_PATH.match(path)
+        if not match or match.group(1) not in charts.FIGURE_BUILDERS:
+            return self.send_error(HTTPStatus.NOT_FOUND, "Unknown figure")
+        try:
+            etag, body = self.server.figures.get(match.group(1))
+        except Exception as e:
+            return self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error building figure: {e}")
+
+        # Clients revalidate on every request, so they pick up a new import straight away
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+        self.send_body(body, 'application/json', etag=etag, cache_control='no-cache')
+
+    def send_body(self, body, content_type, etag=None, cache_control='no-cache'):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', cache_control)
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+# Threaded HTTP server that closes the figure cache, with its connections and thread pool, on server_close()
+class ChartServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db_name):
+        super().__init__(address, ChartRequestHandler)
+        self.figures = FigureCache(db_name)
+
+    def server_close(self):
+        super().server_close()
+        self.figures.close()
+
+# HTTP server for the charts of db_name. Call serve_forever() to run it and server_close() when done
+def make_server(db_name, host="127.0.0.1", port=8050):
+    return ChartServer((host, port), db_name)
+
+# Serve the charts until interrupted
+def serve(db_name, host="127.0.0.1", port=8050):
+    server = make_server(db_name, host, port)
+    print(f"Serving charts at http://{host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
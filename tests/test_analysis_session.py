@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import chart_functions as charts
+import db_functions as db
+
+
+def make_db(path):
+    conn = db.getconn(path)
+    db.ensure_schema(conn.cursor())
+    db.bump_data_version(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def bump_version(path):
+    conn = sqlite3.connect(path)
+    db.bump_data_version(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def test_result_computed_before_reload_is_not_cached_or_shared(tmp_path):
+    path = str(tmp_path / "test.db")
+    make_db(path)
+    session = charts.AnalysisSession(path)
+    session.sync()
+
+    started = threading.Event()
+    release = threading.Event()
+    old_result = []
+
+    def slow_old_compute():
+        started.set()
+        release.wait(10)
+        return "old"
+
+    worker = threading.Thread(target=lambda: old_result.append(session.memo("key", slow_old_compute)))
+    worker.start()
+    assert started.wait(10)
+
+    # An import commits while the old computation is still running
+    bump_version(path)
+    session.sync()
+
+    # A request after the reload computes its own value instead of waiting on the old one
+    timer = threading.Timer(0.5, release.set)
+    timer.start()
+    assert session.memo("key", lambda: "new") == "new"
+    release.set()
+    worker.join(10)
+    timer.cancel()
+
+    assert old_result == ["old"]
+    assert session.memo("key", lambda: "recomputed") == "new"
+    session.close()
+
+
+def test_result_finishing_after_reload_is_dropped(tmp_path):
+    path = str(tmp_path / "test.db")
+    make_db(path)
+    session = charts.AnalysisSession(path)
+    session.sync()
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_old_compute():
+        started.set()
+        release.wait(10)
+        return "old"
+
+    worker = threading.Thread(target=lambda: session.memo("key", slow_old_compute))
+    worker.start()
+    assert started.wait(10)
+    bump_version(path)
+    session.sync()
+    release.set()
+    worker.join(10)
+
+    assert session.memo("key", lambda: "new") == "new"
+    session.close()
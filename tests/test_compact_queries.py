@@ -0,0 +1,69 @@
+import contextlib
+import io
+import re
+import sqlite3
+import pytest
+import benchmark
+import chart_functions as charts
+import db_functions as db
+import main
+
+FILTERS = [
+    None,
+    {'device_type': 'Laptop', 'min_year': 2022, 'max_price': 1500},
+    {'os': ['Windows', 'Linux'], 'min_cpu_tier': 3, 'max_gpu_tier': 4, 'brand': ['Dell', 'HP', 'Apple']},
+]
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("compact")
+    csv_path = str(tmp_path / "feed.csv")
+    benchmark.generate_csv(csv_path, 3000)
+    conns = {}
+    for compact in (False, True):
+        db_path = str(tmp_path / f"test_{int(compact)}.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert main.import_data(mode="full", csv_path=csv_path, db_name=db_path, compact=compact)
+        conns[compact] = sqlite3.connect(db_path)
+    yield conns
+    for conn in conns.values():
+        conn.close()
+
+
+def products_frame(conn, filters):
+    df = charts.query_products_dataframe(conn, list(charts.FRAME_COLUMNS), filters)
+    # Brand ids depend on insertion order, so frames are compared by brand name
+    return df.drop(columns='brandId').sort_values('productId').reset_index(drop=True)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_compact_aggregates_match_wide_schema(databases, filters):
+    for name, query in benchmark.chart_queries().items():
+        wide = query(databases[False].cursor(), live=True, filters=filters)
+        compact = query(databases[True].cursor(), live=True, filters=filters)
+        if name == 'avg_price_by_brand':
+            wide, compact = sorted(wide), sorted(compact)
+        assert db.rows_match(wide, compact), name
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_compact_frame_matches_wide_schema(databases, filters):
+    assert products_frame(databases[True], filters).equals(products_frame(databases[False], filters))
+
+
+def test_compact_queries_bypass_decoding_view(databases):
+    conn = databases[True]
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        for query in benchmark.chart_queries().values():
+            query(conn.cursor(), live=True, filters=FILTERS[1])
+        charts.query_products_dataframe(conn, list(charts.FRAME_COLUMNS), FILTERS[1])
+    finally:
+        conn.set_trace_callback(None)
+
+    assert statements
+    assert not [sql for sql in statements if re.search(r'\b(FROM|JOIN)\s+Products\b', sql)]
+    assert db.check_query_plans(conn) == []
+    assert db.verify_summary_tables(conn.cursor()) == []
@@ -0,0 +1,50 @@
+import gc
+import sqlite3
+import threading
+import db_functions as db
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    del threads, t
+    gc.collect()
+
+
+def test_readers_stay_bounded_across_short_lived_threads(tmp_path):
+    path = str(tmp_path / "test.db")
+    make_db(path)
+    manager = db.ConnectionManager(path, max_idle=2)
+
+    def query():
+        manager.reader().execute("SELECT COUNT(*) FROM t").fetchone()
+
+    for _ in range(10):
+        run_threads(5, query)
+    assert manager.open_readers() <= 2
+    manager.close()
+    assert manager.open_readers() == 0
+
+
+def test_released_reader_is_reused(tmp_path):
+    path = str(tmp_path / "test.db")
+    make_db(path)
+    manager = db.ConnectionManager(path)
+    first = manager.reader()
+    manager.release()
+    seen = []
+    run_threads(1, lambda: seen.append(manager.reader()))
+    assert seen == [first]
+    assert manager.open_readers() == 1
+    manager.close()
@@ -0,0 +1,40 @@
+import contextlib
+import glob
+import io
+import multiprocessing
+import os
+import shutil
+import benchmark
+import main
+
+COLUMNS = ['cpu_tier', 'price', 'model', 'brand', 'device_type']
+
+
+def load_frame(db_path, start):
+    import chart_functions as charts
+    import db_functions as db
+    start.wait()
+    conn = db.getconn_readonly(db_path)
+    try:
+        return len(charts.get_products_dataframe(conn, COLUMNS))
+    finally:
+        conn.close()
+
+
+def test_concurrent_processes_share_frame_cache(tmp_path):
+    csv_path = str(tmp_path / "feed.csv")
+    db_path = str(tmp_path / "test.db")
+    benchmark.generate_csv(csv_path, 3000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert main.import_data(csv_path=csv_path, db_name=db_path)
+
+    cache_dir = tmp_path / ".cache"
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager, ctx.Pool(4) as pool:
+        for _ in range(5):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            start = manager.Barrier(4)
+            results = [pool.apply_async(load_frame, (db_path, start)) for _ in range(4)]
+            assert [r.get(timeout=60) for r in results] == [3000] * 4
+            assert len(glob.glob(os.path.join(cache_dir, "products_*"))) == 1
+            assert not glob.glob(os.path.join(cache_dir, ".tmp-*"))
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import sqlite3
+import benchmark
+import db_functions as db
+import main
+
+
+def run_import(**options):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        ok = main.import_data(**options)
+    return ok, out.getvalue()
+
+
+def data_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return db.get_data_version(conn.cursor())
+    finally:
+        conn.close()
+
+
+def test_unchanged_incremental_import_skips_summaries_and_analyze(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "feed.csv")
+    db_path = str(tmp_path / "test.db")
+    benchmark.generate_csv(csv_path, 2000)
+    ok, _ = run_import(mode="full", csv_path=csv_path, db_name=db_path)
+    assert ok
+    version = data_version(db_path)
+
+    builds = []
+    monkeypatch.setattr(db, "build_summary_tables", lambda cur: builds.append(cur))
+    ok, output = run_import(mode="incremental", csv_path=csv_path, db_name=db_path)
+    assert ok
+    assert "Unchanged: 2000" in output
+    assert "Analyzing tables" not in output
+    assert builds == []
+    assert data_version(db_path) == version
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import sqlite3
+import pytest
+import benchmark
+import db_functions as db
+import main
+import pg_functions as pg
+
+# Set to a scratch database, e.g. postgresql://postgres@localhost/computers_test. Its tables are replaced
+PG_URL = os.environ.get("PG_TEST_URL")
+
+ROWS = 5000
+
+
+def run_import(**options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return main.import_data(**options)
+
+
+def brand_summary(cur):
+    cur.execute("""
+        SELECT b.brand_name, COUNT(*), ROUND(SUM(p.price)::numeric, 2)
+        FROM Products p JOIN Brands b ON b.brandId = p.brandId
+        GROUP BY b.brand_name ORDER BY b.brand_name
+    """)
+    return [(name, count, float(total)) for name, count, total in cur.fetchall()]
+
+
+@pytest.mark.skipif(not PG_URL, reason="PG_TEST_URL is not set")
+@pytest.mark.parametrize("mode", ["full", "stream"])
+def test_postgres_import_matches_sqlite(tmp_path, mode):
+    csv_path = str(tmp_path / "feed.csv")
+    sqlite_path = str(tmp_path / "test.db")
+    benchmark.generate_csv(csv_path, ROWS)
+    assert run_import(mode=mode, chunk_size=1500, csv_path=csv_path, db_name=sqlite_path)
+    assert run_import(mode=mode, chunk_size=1500, csv_path=csv_path, db_name=PG_URL)
+
+    lite = sqlite3.connect(sqlite_path)
+    expected = lite.execute("""
+        SELECT b.brand_name, COUNT(*), ROUND(SUM(p.price), 2)
+        FROM Products p JOIN Brands b ON b.brandId = p.brandId
+        GROUP BY b.brand_name ORDER BY b.brand_name
+    """).fetchall()
+    expected_dims = [lite.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("CPU", "GPU")]
+    lite.close()
+
+    assert db.get_backend(PG_URL) is pg
+    conn = pg.getconn(PG_URL)
+    try:
+        cur = conn.cursor()
+        assert brand_summary(cur) == [tuple(row) for row in expected]
+        dims = []
+        for table in ("CPU", "GPU"):
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            dims.append(cur.fetchone()[0])
+        assert dims == expected_dims
+        cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = 'products'::regclass AND contype = 'f' ORDER BY 1")
+        assert [row[0] for row in cur.fetchall()] == [name for name, _ in pg.FOREIGN_KEYS]
+    finally:
+        conn.close()
+
+
+def test_copy_buffer_quotes_strings_only():
+    text = pg.copy_buffer([(1, 'a,"b"\nc', '', 2.5)]).getvalue()
+    assert text == '1,"a,""b""\nc","",2.5\n'
+
+
+@pytest.mark.skipif(not PG_URL, reason="PG_TEST_URL is not set")
+def test_copy_round_trips_awkward_values():
+    conn = pg.getconn(PG_URL)
+    try:
+        cur = conn.cursor()
+        pg.setup_db(cur)
+        pg.insert_brands(cur, {"Acme"})
+        brand_id = pg.get_brand_map(cur)["Acme"]
+        pg.insert_cpus(cur, {("C1", "Acme", "1", "", "", "", "")}, {"Acme": brand_id})
+        pg.insert_gpus(cur, {("G1", "Acme", "", "8")}, {"Acme": brand_id})
+        row = {col: "" for col in db.PRODUCT_COLUMNS}
+        row.update(cpu_model="C1", gpu_model="G1", model='Pro "14", tab\there\nback\\slash', os="", price="999.5")
+        values = db.product_values(row, brand_id)
+        pg.copy_products(cur, [values])
+        cur.execute(f"SELECT {', '.join(db.PRODUCT_COLUMNS)} FROM Products")
+        assert cur.fetchall() == [values]
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import sqlite3
+import benchmark
+import db_functions as db
+import main
+
+ROWS = 20000
+
+
+def run_import(**options):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        ok = main.import_data(**options)
+    return ok, out.getvalue()
+
+
+def product_count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM Products").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_full_import_discards_interrupted_checkpoint(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "feed.csv")
+    db_path = str(tmp_path / "test.db")
+    benchmark.generate_csv(csv_path, ROWS)
+
+    # Interrupt a resumable import after a few committed chunks
+    write_products = db.write_products
+    calls = []
+
+    def crash_after_chunks(cur, values, brand_names=False):
+        calls.append(len(values))
+        if len(calls) > 3:
+            raise RuntimeError("simulated crash")
+        write_products(cur, values, brand_names)
+
+    monkeypatch.setattr(db, "write_products", crash_after_chunks)
+    ok, _ = run_import(mode="resumable", chunk_size=3000, csv_path=csv_path, db_name=db_path)
+    assert not ok
+    monkeypatch.setattr(db, "write_products", write_products)
+
+    ok, _ = run_import(mode="full", csv_path=csv_path, db_name=db_path)
+    assert ok
+    assert product_count(db_path) == ROWS
+
+    ok, output = run_import(mode="resumable", chunk_size=3000, csv_path=csv_path, db_name=db_path)
+    assert ok
+    assert "Resumed" not in output
+    assert product_count(db_path) == ROWS
+
+
+def test_resumable_import_continues_from_checkpoint(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / "feed.csv")
+    db_path = str(tmp_path / "test.db")
+    benchmark.generate_csv(csv_path, ROWS)
+
+    write_products = db.write_products
+    calls = []
+
+    def crash_after_chunks(cur, values, brand_names=False):
+        calls.append(len(values))
+        if len(calls) > 3:
+            raise RuntimeError("simulated crash")
+        write_products(cur, values, brand_names)
+
+    monkeypatch.setattr(db, "write_products", crash_after_chunks)
+    ok, _ = run_import(mode="resumable", chunk_size=3000, csv_path=csv_path, db_name=db_path)
+    assert not ok
+    monkeypatch.setattr(db, "write_products", write_products)
+
+    ok, output = run_import(mode="resumable", chunk_size=3000, csv_path=csv_path, db_name=db_path)
+    assert ok
+    assert "Resumed after row 9000" in output
+    assert product_count(db_path) == ROWS
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_enable_twice_writes_trace_once(tmp_path):
+    path = tmp_path / "trace.json"
+    writes = tmp_path / "writes"
+    script = f"""
+import json, trace_functions as trace
+real_dump = json.dump
+def counting_dump(*args, **kwargs):
+    with open({str(writes)!r}, 'a') as f:
+        f.write('x')
+    real_dump(*args, **kwargs)
+json.dump = counting_dump
+trace.enable({str(path)!r})
+trace.enable({str(path)!r})
+with trace.stage('work'):
+    pass
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True)
+    assert writes.read_text() == "x"
+    assert path.exists()
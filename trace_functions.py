@@ -0,0 +1,151 @@
+"""
+Functions for timing and profiling pipeline stages
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages are only recorded while enabled, so instrumented code costs next to nothing otherwise
+ENABLED = False
+
+# Names of stages to run under cProfile, and where their .prof files go
+PROFILE_STAGES = set()
+PROFILE_DIR = "."
+
+# Finished stages, in completion order
+events = []
+
+# Start of the trace, so event timestamps are relative to it
+trace_started = time.perf_counter()
+
+_local = threading.local()
+
+# Current resident set size in MB, or None where /proc is not available
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+# Where the trace is written when the program exits, if anywhere. The exit handler is registered once
+TRACE_PATH = None
+_exit_handler_registered = False
+
+# Start recording stages. Stages named in profile also run under cProfile. With trace_path set,
+# the trace is written there when the program exits; a later call with another path replaces it
+def enable(trace_path=None, profile=(), profile_dir="."):
+    global ENABLED, PROFILE_DIR, TRACE_PATH, _exit_handler_registered
+    ENABLED = True
+    PROFILE_STAGES.update(profile)
+    PROFILE_DIR = profile_dir
+    if trace_path:
+        TRACE_PATH = trace_path
+        if not _exit_handler_registered:
+            atexit.register(write_trace_at_exit)
+            _exit_handler_registered = True
+
+def write_trace_at_exit():
+    if TRACE_PATH:
+        write_trace(TRACE_PATH)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    PROFILE_STAGES.clear()
+
+# Drop recorded stages and restart the trace clock
+def reset():
+    global trace_started
+    events.clear()
+    trace_started = time.perf_counter()
+
+# Record a stage's wall time, memory delta and details. Yields a dict the caller can add to, e.g. info['rows'] = n
+@contextmanager
+def stage(name, **details):
+    if not ENABLED:
+        yield details
+        return
+
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    profiler = cProfile.Profile() if name in PROFILE_STAGES else None
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield details
+    finally:
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+        rss_after = current_rss_mb()
+        _local.depth = depth
+        if profiler:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            details['profile'] = os.path.join(PROFILE_DIR, f"{name.replace(' ', '_')}.prof")
+            profiler.dump_stats(details['profile'])
+        events.append({
+            'name': name,
+            'start': started - trace_started,
+            'seconds': elapsed,
+            'depth': depth,
+            'thread': threading.get_ident(),
+            'rss_mb': rss_after,
+            'rss_delta_mb': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            **details,
+        })
+
+# Decorator running a function as a stage named after it. rows maps the result to a row count
+def traced(name=None, rows=None):
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with stage(stage_name) as info:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    info['rows'] = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+# Recorded stages in Chrome trace event format, viewable in chrome://tracing or Perfetto
+def chrome_trace():
+    trace_events = []
+    for event in events:
+        args = {k: v for k, v in event.items() if k not in ('name', 'start', 'seconds', 'depth', 'thread')}
+        trace_events.append({
+            'name': event['name'],
+            'ph': 'X',
+            'ts': event['start'] * 1e6,
+            'dur': event['seconds'] * 1e6,
+            'pid': os.getpid(),
+            'tid': event['thread'],
+            'args': args,
+        })
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+# Write the recorded stages to path: Chrome trace format, or a plain list of stages with fmt="json"
+def write_trace(path, fmt="chrome"):
+    data = chrome_trace() if fmt == "chrome" else events
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+
+# Print recorded stages as an indented table
+def print_stages():
+    for event in sorted(events, key=lambda e: e['start']):
+        rows = f"{event['rows']:>10,} rows" if event.get('rows') is not None else " " * 15
+        delta = f"{event['rss_delta_mb']:+8.1f} MB" if event['rss_delta_mb'] is not None else ""
+        print(f"  {'  ' * event['depth']}{event['name']:<{32 - 2 * event['depth']}} {event['seconds']:>8.3f}s {rows} {delta}")